@@ -2,18 +2,24 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional
-from database import users_collection, password_reset_tokens_collection, db
-
-# Temporary signups collection for unverified users
-pending_users_collection = db.pending_users
-from utils.security import hash_password, verify_password, create_jwt
-from dependencies.auth import get_current_user
+from database import users_collection
+from utils.security import password_hasher, create_jwt
+from dependencies.auth import get_current_user, invalidate_user
 from datetime import datetime, timedelta
 from bson import ObjectId
 import uuid
 import random
 import os
 from services.email_service import send_email
+from services.stats_service import bump_stats
+from services.user_search import search_fields
+from services.auth_token_store import (
+    save_pending_signup,
+    find_pending_signup,
+    delete_pending_signup,
+    create_reset_token,
+    consume_reset_token
+)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -38,6 +44,7 @@ class ResetPasswordSchema(BaseModel):
     new_password: str
 
 class VerifyEmailSchema(BaseModel):
+    email: EmailStr
     otp: str
 
 class CheckEmailSchema(BaseModel):
@@ -51,27 +58,17 @@ async def signup(data: SignupSchema):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    # Check if temp signup exists
-    existing_temp = await pending_users_collection.find_one({"email": data.email})
-    if existing_temp:
-        # Update existing temp signup
-        await pending_users_collection.delete_one({"email": data.email})
-
     # Generate OTP for email verification
     otp = f"{random.randint(100000, 999999)}"
-    verification_expires = datetime.utcnow() + timedelta(minutes=10)
 
-    # Store temporary signup data
-    temp_doc = {
+    # Store temporary signup data, replacing any earlier attempt for this email
+    await save_pending_signup({
         "full_name": data.full_name,
         "email": data.email,
-        "password": hash_password(data.password),
+        "password": await password_hasher.hash(data.password),
         "parish_id": data.parish_id,
-        "otp": otp,
-        "otp_expires": verification_expires,
-        "created_at": datetime.utcnow()
-    }
-    await pending_users_collection.insert_one(temp_doc)
+        "otp": otp
+    })
 
     # Send verification email
     try:
@@ -95,7 +92,7 @@ async def login(data: LoginSchema):
     if not user:
         raise HTTPException(status_code=400, detail="Invalid email or password")
 
-    if not verify_password(data.password, user["password"]):
+    if not await password_hasher.verify(data.password, user["password"]):
         raise HTTPException(status_code=400, detail="Invalid email or password")
 
     token = create_jwt({
@@ -110,14 +107,7 @@ async def forgot_password(payload: ForgotPasswordSchema):
 
     # Do not reveal if email exists
     if user:
-        token = str(uuid.uuid4())
-        reset_doc = {
-            "user_id": str(user["_id"]),
-            "token": token,
-            "expires_at": datetime.utcnow() + timedelta(minutes=15),
-            "created_at": datetime.utcnow()
-        }
-        await password_reset_tokens_collection.insert_one(reset_doc)
+        token = await create_reset_token(str(user["_id"]))
 
         # Send password reset email
         frontend_url = os.getenv("FRONTEND_URL", "http://localhost:5173")
@@ -139,18 +129,19 @@ async def forgot_password(payload: ForgotPasswordSchema):
 
 @router.post("/reset-password")
 async def reset_password(payload: ResetPasswordSchema):
-    record = await password_reset_tokens_collection.find_one({"token": payload.token})
+    # Consumed atomically, so a token cannot be replayed even by concurrent requests
+    record = await consume_reset_token(payload.token)
 
-    if not record or record["expires_at"] < datetime.utcnow():
+    if not record:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    hashed_pw = hash_password(payload.new_password)
+    hashed_pw = await password_hasher.hash(payload.new_password)
+    # Tokens store the user id as a string
     await users_collection.update_one(
-        {"_id": record["user_id"]},
+        {"_id": ObjectId(record["user_id"])},
         {"$set": {"password": hashed_pw}}
     )
-
-    await password_reset_tokens_collection.delete_one({"_id": record["_id"]})
+    await invalidate_user(record["user_id"])
 
     return {"message": "Password reset successful"}
 
@@ -164,8 +155,8 @@ async def check_email(email: str):
 
 @router.post("/verify-email")
 async def verify_email(payload: VerifyEmailSchema):
-    # Find temp signup by OTP
-    temp_signup = await pending_users_collection.find_one({"otp": payload.otp})
+    # Find temp signup by email + OTP
+    temp_signup = await find_pending_signup(payload.email, payload.otp)
 
     if not temp_signup:
         raise HTTPException(status_code=400, detail="Invalid OTP")
@@ -176,7 +167,7 @@ async def verify_email(payload: VerifyEmailSchema):
     # Check if user already exists (in case of duplicate verification)
     existing_user = await users_collection.find_one({"email": temp_signup["email"]})
     if existing_user:
-        await pending_users_collection.delete_one({"_id": temp_signup["_id"]})
+        await delete_pending_signup(temp_signup["_id"])
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Create the actual user
@@ -189,13 +180,15 @@ async def verify_email(payload: VerifyEmailSchema):
         "is_active": True,
         "is_verified": True,
         "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
+        "updated_at": datetime.utcnow(),
+        **search_fields(temp_signup["full_name"], temp_signup["email"])
     }
     result = await users_collection.insert_one(user_doc)
     user_id = str(result.inserted_id)
+    await bump_stats(total_users=1, active_users=1)
 
     # Clean up temp signup
-    await pending_users_collection.delete_one({"_id": temp_signup["_id"]})
+    await delete_pending_signup(temp_signup["_id"])
 
     # Fetch the user to get role
     user = await users_collection.find_one({"_id": ObjectId(user_id)})
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorClient
+from database import client as app_client
+from services.user_search import search_fields, search_users, search_tiers, tier_cursor
+
+# Benchmark runs against a throwaway database so real data is never touched;
+# BENCH_MONGO_URI points it at another server (e.g. a local mongod)
+BENCH_DB_NAME = "church_app_bench"
+client = AsyncIOMotorClient(os.environ["BENCH_MONGO_URI"]) if os.getenv("BENCH_MONGO_URI") else app_client
+INSERT_BATCH = 10000
+QUERIES = 200
+LEGACY_QUERIES = 5
+EXPLAIN_QUERIES = 20
+TARGET_MS = 10
+PAGE_SIZE = 20
+
+FIRST_NAMES = [
+    "Adaeze", "Benedict", "Chidi", "Chioma", "Daniel", "Esther", "Emeka", "Grace", "Ifeanyi", "Joseph",
+    "José", "Kelechi", "Maria", "Mary", "Michael", "Ngozi", "Obinna", "Paul", "Peter", "Ruth",
+    "Samuel", "Sarah", "Stephen", "Teresa", "Uchenna", "Victoria", "Zainab", "Anthony", "Cecilia", "Francis"
+]
+LAST_NAMES = [
+    "Okafor", "Okonkwo", "Eze", "Nwosu", "Adeyemi", "Balogun", "Chukwu", "Obi", "Smith", "Johnson",
+    "Williams", "Brown", "García", "Martínez", "Nnamdi", "Onyeka", "Uzor", "Ibe", "Anyanwu", "Mensah"
+]
+BASE_QUERY = {"is_deleted": {"$ne": True}}
+
+def synthetic_user(i: int, now: datetime) -> dict:
+    first, last = random.choice(FIRST_NAMES), random.choice(LAST_NAMES)
+    full_name = f"{first} {last}"
+    email = f"{first.lower()}.{last.lower()}{i}@example.com"
+    return {
+        "full_name": full_name,
+        "email": email,
+        "is_active": True,
+        "created_at": now - timedelta(seconds=i),
+        **search_fields(full_name, email)
+    }
+
+async def seed(bench_db, user_count: int):
+    await bench_db.users.drop()
+    now = datetime.utcnow()
+    for start in range(0, user_count, INSERT_BATCH):
+        batch = [synthetic_user(i, now) for i in range(start, min(start + INSERT_BATCH, user_count))]
+        await bench_db.users.insert_many(batch, ordered=False)
+    # Same indexes as database.init_db
+    await bench_db.users.create_index("search_email")
+    await bench_db.users.create_index("search_name")
+    await bench_db.users.create_index("search_tokens")
+
+def sample_queries(user_count: int) -> list:
+    """What admins type: name fragments, full names, and email prefixes."""
+    queries = []
+    for _ in range(QUERIES):
+        first, last = random.choice(FIRST_NAMES), random.choice(LAST_NAMES)
+        kind = random.random()
+        if kind < 0.4:
+            queries.append(random.choice([first, last])[:random.randint(2, 6)])
+        elif kind < 0.7:
+            queries.append(f"{first} {last[:random.randint(1, 4)]}")
+        else:
+            queries.append(f"{first.lower()}.{last.lower()}{random.randrange(user_count)}"[:random.randint(6, 20)])
+    return queries
+
+async def indexed_search(bench_db, search: str):
+    return await search_users(bench_db.users, BASE_QUERY, search, PAGE_SIZE)
+
+def index_names(plan: dict) -> set:
+    names = set()
+    stack = [plan]
+    while stack:
+        stage = stack.pop()
+        if "indexName" in stage:
+            names.add(stage["indexName"])
+        stack.extend(stage.get("inputStages", []))
+        if "inputStage" in stage:
+            stack.append(stage["inputStage"])
+    return names
+
+async def explain_search(bench_db, search: str) -> list:
+    """executionStats for each tier search_users would read, with the same exclusions."""
+    rows, seen = [], []
+    for tier in search_tiers(search):
+        remaining = PAGE_SIZE - len(seen)
+        if remaining <= 0:
+            break
+        plan = await tier_cursor(bench_db.users, BASE_QUERY, tier, seen, remaining).explain()
+        stats = plan["executionStats"]
+        rows.append({
+            "tier": tier[1] + (" prefix" if tier[2] else ""),
+            "indexes": sorted(index_names(plan["queryPlanner"]["winningPlan"])),
+            "returned": stats["nReturned"],
+            "keys_examined": stats["totalKeysExamined"],
+            "docs_examined": stats["totalDocsExamined"],
+            "ms": stats["executionTimeMillis"]
+        })
+        async for user in tier_cursor(bench_db.users, BASE_QUERY, tier, seen, remaining):
+            seen.append(user["_id"])
+    return rows
+
+async def report_plans(bench_db, queries: list):
+    worst = {"keys_examined": 0, "docs_examined": 0}
+    for search in queries:
+        print(f"explain {search!r}:")
+        for row in await explain_search(bench_db, search):
+            print(f"  {row}")
+            for key in worst:
+                worst[key] = max(worst[key], row[key])
+    print(f"most keys / docs examined by one tier query: {worst['keys_examined']} / {worst['docs_examined']}")
+
+async def legacy_search(bench_db, search: str):
+    """The original unanchored case-insensitive $regex, kept here only for comparison."""
+    query = {**BASE_QUERY, "$or": [
+        {"full_name": {"$regex": search, "$options": "i"}},
+        {"email": {"$regex": search, "$options": "i"}}
+    ]}
+    return await bench_db.users.find(query).limit(20).to_list(length=None)
+
+async def timed(fn, bench_db, queries: list) -> list:
+    timings = []
+    for search in queries:
+        start = time.perf_counter()
+        await fn(bench_db, search)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings
+
+def p95(timings: list) -> float:
+    return timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+def summary(timings: list) -> str:
+    return f"median {timings[len(timings) // 2]:.2f} ms, p95 {p95(timings):.2f} ms, max {timings[-1]:.2f} ms"
+
+async def main(user_count: int = 500000, explain: bool = False):
+    bench_db = client[BENCH_DB_NAME]
+    print(f"Seeding {user_count} users into '{BENCH_DB_NAME}'...")
+    await seed(bench_db, user_count)
+
+    queries = sample_queries(user_count)
+    # Warm the indexes into cache before measuring
+    await timed(indexed_search, bench_db, queries[:20])
+    indexed = await timed(indexed_search, bench_db, queries)
+    legacy = await timed(legacy_search, bench_db, queries[:LEGACY_QUERIES])
+
+    print(f"indexed prefix search ({len(indexed)} queries): {summary(indexed)}")
+    print(f"legacy $regex search  ({len(legacy)} queries): {summary(legacy)}")
+    verdict = "PASS" if p95(indexed) < TARGET_MS else "FAIL"
+    print(f"p95 under {TARGET_MS} ms: {verdict}")
+    if explain:
+        await report_plans(bench_db, queries[:EXPLAIN_QUERIES])
+
+    await client.drop_database(BENCH_DB_NAME)
+
+if __name__ == "__main__":
+    # python bench_user_search.py [user_count] [--explain]
+    counts = [int(a) for a in sys.argv[1:] if a.isdigit()]
+    asyncio.run(main(*counts[:1], explain="--explain" in sys.argv))
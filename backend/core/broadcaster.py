@@ -0,0 +1,170 @@
+import asyncio
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Tuple
+from bson import ObjectId
+
+# Sent in place of the events a subscriber missed; clients refetch on it
+RESYNC_EVENT = {"type": "resync"}
+
+def new_event_id() -> str:
+    # ObjectIds increase monotonically within a process and sort by time across workers
+    return str(ObjectId())
+
+class Subscription:
+    """A single listener's bounded view of a broadcaster."""
+
+    def __init__(self, maxsize: int):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.lagging = False
+        self.resyncs = 0
+
+    def deliver(self, event_id: Optional[str], event: dict):
+        if self.lagging:
+            # Already told to resync; anything more would be redundant
+            return
+        try:
+            self.queue.put_nowait((event_id, event))
+        except asyncio.QueueFull:
+            self.resync()
+
+    def resync(self):
+        # Coalesce the backlog into a single resync marker instead of growing
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait((None, RESYNC_EVENT))
+        self.lagging = True
+        self.resyncs += 1
+
+    async def get(self, timeout: Optional[float] = None) -> Tuple[Optional[str], dict]:
+        event_id, event = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        if event is RESYNC_EVENT:
+            self.lagging = False
+        return event_id, event
+
+class EventBroadcaster:
+    """
+    In-process pub/sub hub that delivers every published event to every subscriber.
+
+    Each subscriber gets its own bounded queue, so one slow client never holds
+    back the others, and publishing with no subscribers only records the event
+    in a bounded replay buffer. Reconnecting clients pass the last event id they
+    saw and are replayed everything after it, or told to resync if the gap is
+    larger than the buffer.
+    """
+
+    def __init__(self, max_queue_size: int = 100, history_size: int = 500):
+        self.max_queue_size = max_queue_size
+        self.history = deque(maxlen=history_size)
+        self.subscribers = set()
+
+    @contextmanager
+    def subscribe(self, last_event_id: Optional[str] = None):
+        missed = self.missed_since(last_event_id) if last_event_id else []
+        # Room for the whole replay on top of the live backlog, so any gap the
+        # history still covers is replayed rather than turned into a resync
+        subscription = Subscription(self.max_queue_size + len(missed or ()))
+        if missed is None:
+            # The gap is older than the buffer; only a full refetch can close it
+            subscription.resync()
+        else:
+            for event_id, event in missed:
+                subscription.deliver(event_id, event)
+        self.subscribers.add(subscription)
+        try:
+            yield subscription
+        finally:
+            self.subscribers.discard(subscription)
+
+    def missed_since(self, last_event_id: str) -> Optional[list]:
+        """Everything published after last_event_id in arrival order, or None if it is no longer buffered."""
+        for index, (event_id, _) in enumerate(self.history):
+            if event_id == last_event_id:
+                return list(self.history)[index + 1:]
+        return None
+
+    def publish(self, event: dict, event_id: Optional[str] = None) -> str:
+        event_id = event_id or new_event_id()
+        self.history.append((event_id, event))
+        for subscription in list(self.subscribers):
+            subscription.deliver(event_id, event)
+        return event_id
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "lagging": sum(1 for s in self.subscribers if s.lagging),
+            "buffered_events": len(self.history)
+        }
+
+class TopicBroadcaster:
+    """
+    Routes events to a per-topic EventBroadcaster, e.g. one per prayer thread.
+
+    A topic's broadcaster is created by its first subscriber and kept for
+    idle_grace_seconds after its last one leaves, still recording history, so
+    a client that reconnects with Last-Event-ID is replayed what it missed
+    instead of resyncing. Events for threads nobody has open (or recently
+    had open) are discarded without any work.
+    """
+
+    def __init__(self, topic_field: str, idle_grace_seconds: float = 120, clock=time.monotonic,
+                 **broadcaster_options):
+        self.topic_field = topic_field
+        self.idle_grace_seconds = idle_grace_seconds
+        self.clock = clock
+        self.broadcaster_options = broadcaster_options
+        self.topics = {}
+        # topic -> when its last subscriber left
+        self.idle_since = {}
+
+    @contextmanager
+    def subscribe(self, topic: str, last_event_id: Optional[str] = None):
+        self.expire_idle()
+        broadcaster = self.topics.get(topic)
+        if broadcaster is None:
+            broadcaster = self.topics[topic] = EventBroadcaster(**self.broadcaster_options)
+        self.idle_since.pop(topic, None)
+        try:
+            with broadcaster.subscribe(last_event_id=last_event_id) as subscription:
+                yield subscription
+        finally:
+            if not broadcaster.subscribers and self.topics.get(topic) is broadcaster:
+                self.idle_since[topic] = self.clock()
+
+    def expire_idle(self):
+        """Drop topics whose grace period has run out."""
+        cutoff = self.clock() - self.idle_grace_seconds
+        for topic, since in list(self.idle_since.items()):
+            if since <= cutoff:
+                del self.idle_since[topic]
+                self.topics.pop(topic, None)
+
+    def publish(self, event: dict, event_id: Optional[str] = None) -> Optional[str]:
+        self.expire_idle()
+        broadcaster = self.topics.get(event.get(self.topic_field))
+        if broadcaster:
+            return broadcaster.publish(event, event_id)
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self.topics),
+            "idle_topics": len(self.idle_since),
+            "subscribers": sum(len(b.subscribers) for b in self.topics.values())
+        }
+
+async def sse_stream(subscription_context, keepalive_seconds: int = 60):
+    """Format a subscription as Server-Sent Events, with id lines and periodic keep-alives."""
+    # Unsubscribes automatically when the client disconnects
+    with subscription_context as subscription:
+        while True:
+            try:
+                event_id, event = await subscription.get(timeout=keepalive_seconds)
+                id_line = f"id: {event_id}\n" if event_id else ""
+                yield f"{id_line}data: {json.dumps(event, default=str)}\n\n"
+            except asyncio.TimeoutError:
+                # Send keep-alive
+                yield "data: {\"type\": \"ping\"}\n\n"
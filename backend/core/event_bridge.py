@@ -0,0 +1,189 @@
+import asyncio
+import os
+import uuid
+from collections import deque
+from datetime import datetime
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import OperationFailure
+from database import db, stream_events_collection
+from core.broadcaster import new_event_id
+
+# Capped collection size for the cross-worker event log (stream_events)
+EVENTS_COLLECTION_SIZE = 16 * 1024 * 1024
+RECONNECT_DELAY_SECONDS = 1
+# Change stream error when the resume token has fallen off the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+class CappedCollectionEventLog:
+    """
+    Event log backed by a capped collection tailed with an awaitable cursor; works without a replica set.
+
+    Position is tracked as the last event read, in insertion ($natural) order:
+    event ids come from every worker's clock and are not monotonic across
+    workers, so resuming with _id > last_id could skip another worker's events.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.last_id = None
+
+    async def ensure_collection(self):
+        if self.collection.name not in await db.list_collection_names():
+            await db.create_collection(self.collection.name, capped=True, size=EVENTS_COLLECTION_SIZE)
+
+    async def append(self, doc: dict):
+        await self.collection.insert_one(doc)
+
+    async def tail(self):
+        if self.last_id is None:
+            # Start after the newest existing event so history is not replayed
+            newest = await self.collection.find_one(sort=[("$natural", -1)])
+            self.last_id = newest["_id"] if newest else None
+        while True:
+            # Walk from the start of the log and skip up to the last event read. If that
+            # event has been overwritten, everything still in the log came after it.
+            seeking = self.last_id is not None and await self.collection.find_one({"_id": self.last_id}) is not None
+            cursor = self.collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT, sort=[("$natural", 1)])
+            while cursor.alive:
+                async for doc in cursor:
+                    if seeking:
+                        seeking = doc["_id"] != self.last_id
+                        continue
+                    self.last_id = doc["_id"]
+                    yield doc
+            # A tailable cursor on an empty collection dies immediately
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+class ChangeStreamEventLog:
+    """
+    Event log read through a change stream; requires a replica set (e.g. Atlas).
+
+    The resume token of the last change read is kept, so a reconnect picks up
+    where the previous stream stopped.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.resume_token = None
+
+    async def ensure_collection(self):
+        if self.collection.name not in await db.list_collection_names():
+            await db.create_collection(self.collection.name, capped=True, size=EVENTS_COLLECTION_SIZE)
+
+    async def append(self, doc: dict):
+        await self.collection.insert_one(doc)
+
+    async def tail(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        try:
+            async with self.collection.watch(pipeline, resume_after=self.resume_token) as stream:
+                async for change in stream:
+                    self.resume_token = stream.resume_token
+                    yield change["fullDocument"]
+        except OperationFailure as e:
+            if e.code == CHANGE_STREAM_HISTORY_LOST:
+                # Down longer than the oplog window: nothing left to resume from
+                print("Event bridge resume token expired, continuing from now")
+                self.resume_token = None
+            raise
+
+class InMemoryEventLog:
+    """
+    Process-local stand-in for the events collection.
+
+    Several bridges can share one instance to simulate multiple workers in
+    tests, and single-worker development needs no extra collection.
+    """
+
+    def __init__(self, max_events: int = 1000):
+        self.events = deque(maxlen=max_events)
+        self.appended = 0
+        self.condition = asyncio.Condition()
+
+    async def ensure_collection(self):
+        pass
+
+    async def append(self, doc: dict):
+        async with self.condition:
+            self.events.append(doc)
+            self.appended += 1
+            self.condition.notify_all()
+
+    async def tail(self):
+        seen = self.appended
+        while True:
+            async with self.condition:
+                await self.condition.wait_for(lambda: self.appended > seen)
+                missed = min(self.appended - seen, len(self.events))
+                new_events = list(self.events)[-missed:]
+                seen = self.appended
+            for doc in new_events:
+                yield doc
+
+class EventBridge:
+    """
+    Propagates broadcaster events between uvicorn workers.
+
+    Events are delivered to the local broadcaster immediately and appended to a
+    shared log. Each worker runs a single tail over that log and republishes
+    other workers' events locally, so every insert is read once per worker
+    rather than once per SSE connection.
+    """
+
+    def __init__(self, log, worker_id: str = None):
+        self.log = log
+        self.worker_id = worker_id or uuid.uuid4().hex
+        self.channels = {}
+
+    def register(self, channel: str, broadcaster):
+        self.channels[channel] = broadcaster
+
+    async def publish(self, channel: str, event: dict) -> str:
+        # The same id is used on every worker, so Last-Event-ID works wherever a client reconnects
+        event_id = new_event_id()
+        broadcaster = self.channels.get(channel)
+        if broadcaster:
+            broadcaster.publish(event, event_id)
+        try:
+            await self.log.append({
+                "_id": ObjectId(event_id),
+                "channel": channel,
+                "event": event,
+                "origin": self.worker_id,
+                "created_at": datetime.utcnow()
+            })
+        except Exception as e:
+            # Callers publish after their write has committed; failing the request
+            # now would report an error for a change that already happened
+            print(f"Event bridge failed to publish {channel} event to other workers: {e}")
+        return event_id
+
+    def dispatch(self, doc: dict):
+        if doc.get("origin") == self.worker_id:
+            return
+        broadcaster = self.channels.get(doc.get("channel"))
+        if broadcaster:
+            broadcaster.publish(doc["event"], str(doc["_id"]))
+
+    async def run(self):
+        await self.log.ensure_collection()
+        while True:
+            try:
+                async for doc in self.log.tail():
+                    self.dispatch(doc)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Event bridge tail failed, reconnecting: {e}")
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+def create_event_log():
+    mode = os.getenv("EVENT_BRIDGE_MODE", "capped")
+    if mode == "change_stream":
+        return ChangeStreamEventLog(stream_events_collection)
+    if mode == "memory":
+        return InMemoryEventLog()
+    return CappedCollectionEventLog(stream_events_collection)
+
+event_bridge = EventBridge(create_event_log())
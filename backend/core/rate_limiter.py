@@ -0,0 +1,256 @@
+import ipaddress
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import jwt
+from pymongo import ReturnDocument
+from starlette.responses import JSONResponse
+from database import rate_limits_collection
+from utils.security import SECRET_KEY, ALGORITHM
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """
+    A token bucket applied to every request matching methods + path.
+
+    key is what the bucket is per: "ip", "user" (JWT subject, falling back to
+    IP for anonymous calls) or "email" (from the JSON body, for login-style
+    endpoints where the caller is not authenticated yet).
+    """
+    name: str
+    methods: frozenset
+    path: str
+    key: str
+    capacity: int
+    per_seconds: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.per_seconds
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and re.match(self.path, path) is not None
+
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+RATE_LIMIT_POLICIES = [
+    # Login is the bcrypt hot spot: cap per source IP and per target account
+    RateLimitPolicy("login_ip", frozenset({"POST"}), r"^/auth/login$", "ip", 20, 60),
+    RateLimitPolicy("login_account", frozenset({"POST"}), r"^/auth/login$", "email", 5, 60),
+    RateLimitPolicy("signup_ip", frozenset({"POST"}), r"^/auth/signup$", "ip", 5, 60),
+    RateLimitPolicy("verify_email_ip", frozenset({"POST"}), r"^/auth/verify-email$", "ip", 10, 60),
+    RateLimitPolicy("password_reset_ip", frozenset({"POST"}), r"^/auth/(forgot|reset)-password$", "ip", 5, 60),
+    RateLimitPolicy("change_password_user", frozenset({"PUT"}), r"^/users/change-password$", "user", 5, 60),
+    # Sensitive admin user-management writes (previously declared with slowapi but never enforced)
+    RateLimitPolicy("admin_write_user", WRITE_METHODS, r"^/admin/users(/|$)", "user", 5, 60),
+]
+
+# Bodies buffered for email-keyed policies are login/reset payloads; anything bigger is refused
+MAX_BUFFERED_BODY = 16 * 1024
+
+def parse_trusted_proxies(value: str) -> list:
+    """Comma-separated addresses or CIDR ranges, e.g. "127.0.0.1,10.0.0.0/8"."""
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in value.split(",") if part.strip()]
+
+# X-Forwarded-For is only honoured on connections from these proxies
+TRUSTED_PROXIES = parse_trusted_proxies(os.getenv("TRUSTED_PROXIES", ""))
+
+class InMemoryBucketStore:
+    """Per-process buckets; limits are per worker. LRU-bounded so IP churn cannot grow it forever."""
+
+    def __init__(self, maxsize: int = 100000, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        self.buckets = OrderedDict()
+
+    async def consume(self, key: str, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        now = self.clock()
+        tokens, updated_at = self.buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > self.maxsize:
+            self.buckets.popitem(last=False)
+        return allowed, tokens
+
+class MongoBucketStore:
+    """Buckets shared by every worker, refilled and consumed in one atomic pipeline update."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def consume(self, key: str, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        now = time.time()
+        refilled = {"$min": [
+            capacity,
+            {"$add": [
+                {"$ifNull": ["$tokens", capacity]},
+                {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, refill_per_second]}
+            ]}
+        ]}
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": now}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    # A bucket idle this long is full again, so the TTL index can drop it
+                    "expires_at": datetime.utcnow() + timedelta(seconds=capacity / refill_per_second)
+                }}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["allowed"], doc["tokens"]
+
+def create_bucket_store():
+    if os.getenv("RATE_LIMIT_BACKEND", "mongo") == "memory":
+        return InMemoryBucketStore()
+    return MongoBucketStore(rate_limits_collection)
+
+def is_trusted_proxy(address: str, trusted_proxies) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+def client_ip(scope, trusted_proxies=None) -> str:
+    """
+    The address a request came from. X-Forwarded-For is client-controlled, so
+    it is only read when the connection comes from a trusted proxy, and then
+    the rightmost hop that is not itself a trusted proxy is used.
+    """
+    trusted_proxies = TRUSTED_PROXIES if trusted_proxies is None else trusted_proxies
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not is_trusted_proxy(peer, trusted_proxies):
+        return peer
+    hops = []
+    for name, value in scope.get("headers", []):
+        if name == b"x-forwarded-for":
+            hops.extend(hop.strip() for hop in value.decode("latin-1").split(","))
+    for hop in reversed(hops):
+        if hop and not is_trusted_proxy(hop, trusted_proxies):
+            return hop
+    return peer
+
+def token_subject(scope) -> Optional[str]:
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode().partition(" ")
+            if scheme.lower() != "bearer":
+                return None
+            try:
+                return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            except jwt.InvalidTokenError:
+                return None
+    return None
+
+def body_email(body: bytes) -> Optional[str]:
+    try:
+        email = json.loads(body).get("email")
+    except (ValueError, AttributeError):
+        return None
+    return email.strip().lower() if isinstance(email, str) else None
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware enforcing RATE_LIMIT_POLICIES before routing.
+
+    Rejected requests get a 429 with Retry-After and never reach dependencies
+    or handlers. If the shared store is unreachable the request is let through
+    rather than taking the API down with it.
+    """
+
+    def __init__(self, app, policies=None, store=None, trusted_proxies=None):
+        self.app = app
+        self.policies = policies if policies is not None else RATE_LIMIT_POLICIES
+        self.store = store or create_bucket_store()
+        self.trusted_proxies = trusted_proxies if trusted_proxies is not None else TRUSTED_PROXIES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        policies = [p for p in self.policies if p.matches(scope["method"], scope["path"])]
+        if not policies:
+            await self.app(scope, receive, send)
+            return
+
+        if any(p.key == "email" for p in policies):
+            # Buffer the (small) auth body so it can be inspected and then replayed to the app
+            body = await self.read_body(receive)
+            if body is None:
+                response = JSONResponse(status_code=413, content={"detail": "Request body too large"})
+                await response(scope, receive, send)
+                return
+            receive = self.replay_body(body, receive)
+        else:
+            body = b""
+
+        for policy in policies:
+            key = self.bucket_key(policy, scope, body)
+            if key is None:
+                continue
+            try:
+                allowed, tokens = await self.store.consume(
+                    f"{policy.name}:{key}", policy.capacity, policy.refill_per_second
+                )
+            except Exception as e:
+                print(f"Rate limit store unavailable, allowing request: {e}")
+                continue
+            if not allowed:
+                retry_after = max(1, int((1 - tokens) / policy.refill_per_second + 0.999))
+                response = JSONResponse(
+                    status_code=429,
+                    content={"detail": "Too many requests. Please try again later."},
+                    headers={"Retry-After": str(retry_after)}
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
+
+    def bucket_key(self, policy: RateLimitPolicy, scope, body: bytes) -> Optional[str]:
+        if policy.key == "email":
+            return body_email(body)
+        if policy.key == "user":
+            subject = token_subject(scope)
+            return f"user:{subject}" if subject else f"ip:{client_ip(scope, self.trusted_proxies)}"
+        return client_ip(scope, self.trusted_proxies)
+
+    @staticmethod
+    async def read_body(receive, limit: int = MAX_BUFFERED_BODY) -> Optional[bytes]:
+        """The full request body, or None once it grows past limit."""
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > limit:
+                return None
+            more_body = message.get("more_body", False)
+        return body
+
+    @staticmethod
+    def replay_body(body: bytes, receive):
+        replayed = False
+
+        async def receive_replayed():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return receive_replayed
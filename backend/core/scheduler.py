@@ -0,0 +1,259 @@
+import asyncio
+import os
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+from pymongo import ReturnDocument
+from database import scheduler_leases_collection, scheduler_runs_collection
+
+# Lease holders that crash keep the lease this much past the job's budget, then it is up for grabs
+LEASE_GRACE = timedelta(seconds=30)
+NEVER = datetime(1970, 1, 1)
+
+class IntervalSchedule:
+    """Run every fixed interval, first run immediately on startup."""
+
+    def __init__(self, seconds: float = 0, minutes: float = 0, hours: float = 0):
+        self.interval = timedelta(seconds=seconds, minutes=minutes, hours=hours)
+
+    def first_run_after(self, moment: datetime) -> datetime:
+        return moment
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + self.interval
+
+class CronSchedule:
+    """
+    Standard five-field cron expression: minute hour day-of-month month day-of-week.
+
+    Fields accept *, numbers, ranges (a-b), steps (*/n, a-b/n) and comma lists.
+    Day-of-week is 0-6 with 0 (or 7) meaning Sunday.
+    """
+
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        parsed = [self._parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, self.FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse_field(field_expr: str, lo: int, hi: int) -> set:
+        values = set()
+        for part in field_expr.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                step = int(step_text)
+            if part == "*":
+                start, end = lo, hi
+            elif "-" in part:
+                start_text, end_text = part.split("-", 1)
+                start, end = int(start_text), int(end_text)
+            else:
+                start = end = int(part)
+            if start < lo or end > hi or start > end or step < 1:
+                raise ValueError(f"Cron field {field_expr!r} out of range {lo}-{hi}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        # cron counts Sunday as 0, Python's weekday() counts Monday as 0
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        # Both restricted: cron runs when either matches
+        return day_ok or weekday_ok
+
+    def first_run_after(self, moment: datetime) -> datetime:
+        return self.next_after(moment)
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Awaitable]
+    schedule: object
+    jitter_seconds: float = 0
+    time_budget_seconds: float = 300
+    # Earliest time this worker bothers asking the store about the job again
+    next_check_at: Optional[datetime] = field(default=None, repr=False)
+    registered: bool = field(default=False, repr=False)
+
+class MongoJobStore:
+    """Leases and run history in MongoDB so only one worker runs each job occurrence."""
+
+    async def register(self, name: str, first_run_at: datetime):
+        await scheduler_leases_collection.update_one(
+            {"_id": name},
+            {"$setOnInsert": {"next_run_at": first_run_at, "lease_until": NEVER, "owner": None}},
+            upsert=True
+        )
+
+    async def acquire(self, name: str, owner: str, now: datetime, lease_until: datetime):
+        """Take the lease if the job is due and unleased; otherwise return the current lease document."""
+        doc = await scheduler_leases_collection.find_one_and_update(
+            {"_id": name, "next_run_at": {"$lte": now}, "lease_until": {"$lte": now}},
+            {"$set": {"owner": owner, "lease_until": lease_until}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc:
+            return True, doc
+        return False, await scheduler_leases_collection.find_one({"_id": name})
+
+    async def release(self, name: str, owner: str, finished_at: datetime, next_run_at: datetime):
+        await scheduler_leases_collection.update_one(
+            {"_id": name, "owner": owner},
+            {"$set": {"lease_until": finished_at, "next_run_at": next_run_at, "last_finished_at": finished_at}}
+        )
+
+    async def record_run(self, run: dict):
+        await scheduler_runs_collection.insert_one(run)
+
+class InMemoryJobStore:
+    """Process-local stand-in for MongoJobStore; shared instances simulate several workers in tests."""
+
+    def __init__(self):
+        self.leases = {}
+        self.runs = []
+
+    async def register(self, name: str, first_run_at: datetime):
+        self.leases.setdefault(name, {"_id": name, "next_run_at": first_run_at, "lease_until": NEVER, "owner": None})
+
+    async def acquire(self, name: str, owner: str, now: datetime, lease_until: datetime):
+        lease = self.leases[name]
+        if lease["next_run_at"] <= now and lease["lease_until"] <= now:
+            lease.update(owner=owner, lease_until=lease_until)
+            return True, dict(lease)
+        return False, dict(lease)
+
+    async def release(self, name: str, owner: str, finished_at: datetime, next_run_at: datetime):
+        lease = self.leases[name]
+        if lease["owner"] == owner:
+            lease.update(lease_until=finished_at, next_run_at=next_run_at, last_finished_at=finished_at)
+
+    async def record_run(self, run: dict):
+        self.runs.append(run)
+
+class Scheduler:
+    """
+    Runs periodic maintenance jobs in-process under a per-job lease.
+
+    Every worker runs a scheduler, but a job occurrence only executes on the
+    worker that wins its lease, so N workers still run each job once. Between
+    due times a worker does not query the store at all.
+    """
+
+    def __init__(self, store, clock: Callable[[], datetime] = datetime.utcnow, sleep=asyncio.sleep,
+                 tick_seconds: float = 5, owner: str = None):
+        self.store = store
+        self.clock = clock
+        self.sleep = sleep
+        self.tick_seconds = tick_seconds
+        self.owner = owner or uuid.uuid4().hex
+        self.jobs = {}
+        self.task = None
+
+    def add_job(self, name: str, func: Callable[[], Awaitable], schedule, jitter_seconds: float = 0,
+                time_budget_seconds: float = 300):
+        self.jobs[name] = Job(name, func, schedule, jitter_seconds, time_budget_seconds)
+
+    async def run_pending(self) -> list:
+        """Run every job that is due and whose lease this worker wins. Returns the run records."""
+        runs = []
+        for job in self.jobs.values():
+            now = self.clock()
+            if job.next_check_at and now < job.next_check_at:
+                continue
+            if not job.registered:
+                await self.store.register(job.name, job.schedule.first_run_after(now))
+                job.registered = True
+            lease_until = now + timedelta(seconds=job.time_budget_seconds) + LEASE_GRACE
+            acquired, lease = await self.store.acquire(job.name, self.owner, now, lease_until)
+            if not acquired:
+                job.next_check_at = max(lease["next_run_at"], lease["lease_until"])
+                continue
+            runs.append(await self._run(job))
+        return runs
+
+    async def _run(self, job: Job) -> dict:
+        started_at = self.clock()
+        result, error = None, None
+        try:
+            result = await asyncio.wait_for(job.func(), timeout=job.time_budget_seconds)
+            status = "success"
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except Exception as e:
+            status, error = "failed", str(e)
+            print(f"Scheduled job {job.name} failed: {e}")
+        finished_at = self.clock()
+
+        jitter = timedelta(seconds=random.uniform(0, job.jitter_seconds)) if job.jitter_seconds else timedelta()
+        next_run_at = job.schedule.next_after(finished_at) + jitter
+        await self.store.release(job.name, self.owner, finished_at, next_run_at)
+        job.next_check_at = next_run_at
+
+        run = {
+            "job": job.name,
+            "owner": self.owner,
+            "status": status,
+            "result": result,
+            "error": error,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "duration_ms": round((finished_at - started_at).total_seconds() * 1000, 1),
+            "next_run_at": next_run_at
+        }
+        await self.store.record_run(run)
+        return run
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.run_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Scheduler tick failed: {e}")
+            await self.sleep(self.tick_seconds)
+
+    def start(self):
+        self.task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+def create_job_store():
+    if os.getenv("SCHEDULER_BACKEND", "mongo") == "memory":
+        return InMemoryJobStore()
+    return MongoJobStore()
+
+scheduler = Scheduler(create_job_store())
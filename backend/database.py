@@ -29,18 +29,68 @@ events_collection = db.events
 roles_collection = db.roles
 user_roles_collection = db.user_roles
 password_reset_tokens_collection = db.password_reset_tokens
+pending_users_collection = db.pending_users
 admin_audit_logs_collection = db.admin_audit_logs
+stream_events_collection = db.stream_events
+rate_limits_collection = db.rate_limits
+scheduler_leases_collection = db.scheduler_leases
+scheduler_runs_collection = db.scheduler_runs
+export_jobs_collection = db.export_jobs
+stats_collection = db.stats
+activity_rollups_collection = db.activity_rollups
+rollup_watermarks_collection = db.rollup_watermarks
+
+async def ensure_unique_reaction_index():
+    """
+    One reaction per user per testimony. Existing data may hold duplicates
+    from double clicks, which would block the unique index: keep each pair's
+    oldest reaction first. The reaction counter reconciler corrects the
+    counters afterwards.
+    """
+    keys = [("user_id", 1), ("testimony_id", 1)]
+    existing = (await testimony_reactions_collection.index_information()).get("user_id_1_testimony_id_1")
+    if existing:
+        return
+    duplicates = testimony_reactions_collection.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": {"user_id": "$user_id", "testimony_id": "$testimony_id"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}}
+    ], allowDiskUse=True)
+    async for group in duplicates:
+        await testimony_reactions_collection.delete_many({"_id": {"$in": group["ids"][1:]}})
+    # Idempotent, so workers starting together can all get here
+    await testimony_reactions_collection.create_index(keys, unique=True)
 
 async def init_db():
     # Users indexes
     await users_collection.create_index("email", unique=True)
     await users_collection.create_index("parish_id")
+    # Admin listing: keyset pagination, with and without a parish filter
+    await users_collection.create_index([("created_at", -1), ("_id", -1)])
+    await users_collection.create_index([("parish_id", 1), ("created_at", -1), ("_id", -1)])
+    # Soft-deleted count subtracted from the estimated total of unfiltered listings
+    await users_collection.create_index("is_deleted")
+    # Admin user search: anchored prefix matches on normalized email and name words
+    await users_collection.create_index("search_email")
+    await users_collection.create_index("search_name")
+    await users_collection.create_index("search_tokens")
+    # Incremental exports: changes since a watermark, in index order
+    await users_collection.create_index([("updated_at", 1), ("_id", 1)])
 
     # Prayers indexes
     await prayers_collection.create_index("parish_id")
     await prayers_collection.create_index([("created_at", -1)])
     await prayers_collection.create_index("is_approved")
     await prayers_collection.create_index("expires_at", expireAfterSeconds=0)
+    # Keyset pagination for the prayer wall, with and without a parish filter
+    await prayers_collection.create_index([("is_approved", 1), ("created_at", -1), ("_id", -1)])
+    await prayers_collection.create_index([("parish_id", 1), ("is_approved", 1), ("created_at", -1), ("_id", -1)])
+    # Admin prayer listing, unfiltered and by pending/answered status
+    await prayers_collection.create_index([("created_at", -1), ("_id", -1)])
+    await prayers_collection.create_index([("response_count", 1), ("created_at", -1), ("_id", -1)])
+    await prayers_collection.create_index("is_deleted")
+    # Incremental exports: changes since a watermark, in index order
+    await prayers_collection.create_index([("updated_at", 1), ("_id", 1)])
 
     # Prayer responses indexes
     await prayer_responses_collection.create_index("prayer_id")
@@ -52,11 +102,16 @@ async def init_db():
     await testimonies_collection.create_index([("created_at", -1)])
     await testimonies_collection.create_index("is_deleted")
     await testimonies_collection.create_index("expires_at", expireAfterSeconds=0)
+    # Keyset pagination for the testimony feed
+    await testimonies_collection.create_index([("created_at", -1), ("_id", -1)])
 
     # Testimony reactions indexes
     await testimony_reactions_collection.create_index("testimony_id")
+    await testimony_reactions_collection.create_index("created_at")
     await testimony_reactions_collection.create_index("user_id")
     await testimony_reactions_collection.create_index("is_deleted")
+    # Caller's own reaction lookup for a page of testimonies; also stops double-click duplicates
+    await ensure_unique_reaction_index()
 
     # Notifications indexes
     await notifications_collection.create_index("user_id")
@@ -67,17 +122,42 @@ async def init_db():
     await announcements_collection.create_index("parish_id")
     await announcements_collection.create_index([("created_at", -1)])
 
+    # Parishes indexes
+    await parishes_collection.create_index([("updated_at", 1), ("_id", 1)])
+
     # Events indexes
     await events_collection.create_index("parish_id")
     await events_collection.create_index("event_date")
 
     # Password reset tokens TTL index
     await password_reset_tokens_collection.create_index("expires_at", expireAfterSeconds=0)
+    await password_reset_tokens_collection.create_index("token", unique=True)
+
+    # Pending signups: verification is keyed by email + OTP, stale signups expire
+    await pending_users_collection.create_index([("email", 1), ("otp", 1)], unique=True)
+    await pending_users_collection.create_index("otp_expires", expireAfterSeconds=0)
 
     # User roles indexes
     await user_roles_collection.create_index("user_id")
     await user_roles_collection.create_index("role_id")
 
+    # Idle rate limit buckets are full again by expires_at, so drop them
+    await rate_limits_collection.create_index("expires_at", expireAfterSeconds=0)
+
+    # Scheduler run history is kept for 30 days
+    await scheduler_runs_collection.create_index([("job", 1), ("started_at", -1)])
+    await scheduler_runs_collection.create_index("started_at", expireAfterSeconds=30 * 24 * 3600)
+
+    # Activity rollups: $merge target key, and range reads across all parishes
+    await activity_rollups_collection.create_index(
+        [("metric", 1), ("granularity", 1), ("parish_id", 1), ("bucket_start", 1)], unique=True
+    )
+    await activity_rollups_collection.create_index([("metric", 1), ("granularity", 1), ("bucket_start", 1)])
+
+    # Export jobs: stalled-job pickup and artifact retention
+    await export_jobs_collection.create_index([("status", 1), ("lease_until", 1)])
+    await export_jobs_collection.create_index("expires_at", sparse=True)
+
     # Legacy prayer requests TTL index (24 hours)
     prayer_collection = db.prayer_requests
     await prayer_collection.create_index("createdAt", expireAfterSeconds=86400)
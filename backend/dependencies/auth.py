@@ -2,20 +2,59 @@ from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 import jwt
 from utils import SECRET_KEY, ALGORITHM
+from utils.cache import TTLCache
 from database import users_collection
+from core.event_bridge import event_bridge
 from bson import ObjectId
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# User records by id; writes invalidate explicitly, the TTL bounds staleness for anything missed
+user_cache = TTLCache(maxsize=10000, ttl=60)
+
+class UserCacheInvalidations:
+    """Receives invalidations published by other workers through the event bridge."""
+
+    def publish(self, event: dict, event_id: str = None):
+        user_cache.invalidate(event["user_id"])
+
+event_bridge.register("user_invalidations", UserCacheInvalidations())
+
+async def invalidate_user(user_id):
+    """Drop a user's cached record on every worker; call after any write to the user document."""
+    await event_bridge.publish("user_invalidations", {"user_id": str(user_id)})
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload["sub"]
-        user = await users_collection.find_one({"_id": ObjectId(user_id)})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
+        user = user_cache.get(user_id)
+        if user is None:
+            user = await users_collection.find_one({"_id": ObjectId(user_id)})
+            if not user:
+                raise HTTPException(status_code=401, detail="User not found")
+            user_cache.set(user_id, user)
+        # Handlers annotate the returned dict, so never hand out the cached one
+        return dict(user)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+def verify_stream_token(token: str = None) -> str:
+    """
+    Authenticate an SSE connection from its token query param.
+
+    EventSource cannot send headers, so streams pass the JWT in the URL.
+    Returns the user id from the token.
+    """
+    if not token:
+        raise HTTPException(status_code=401, detail="Token required")
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = payload.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user_id
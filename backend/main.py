@@ -10,10 +10,60 @@ from routers.users import router as users_router
 from routers.test_email import router as test_email_router
 from auth import router as auth_router
 from database import init_db, engine, Base
+from services.reaction_service import reconcile_reaction_counters
+from services.expiry_sweeper import sweep_expired_testimonies
+from services.export_jobs import resume_export_jobs
+from services.stats_service import reconcile_dashboard_stats
+from services.analytics_rollups import rollup_activity
+from services.user_search import backfill_user_search_fields
+from core.event_bridge import event_bridge
+from core.scheduler import scheduler, IntervalSchedule
+from core.rate_limiter import RateLimitMiddleware
+from contextlib import asynccontextmanager
+import asyncio
 
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Spiritual App API")
+# Periodic maintenance; each job runs on one worker at a time under a Mongo lease
+scheduler.add_job(
+    "sweep_expired_testimonies", sweep_expired_testimonies,
+    IntervalSchedule(minutes=10), jitter_seconds=30, time_budget_seconds=60
+)
+scheduler.add_job(
+    "reconcile_reaction_counters", reconcile_reaction_counters,
+    IntervalSchedule(hours=1), jitter_seconds=120, time_budget_seconds=600
+)
+scheduler.add_job(
+    "reconcile_dashboard_stats", reconcile_dashboard_stats,
+    IntervalSchedule(minutes=15), jitter_seconds=60, time_budget_seconds=300
+)
+scheduler.add_job(
+    "rollup_activity", rollup_activity,
+    IntervalSchedule(minutes=5), jitter_seconds=30, time_budget_seconds=240
+)
+scheduler.add_job(
+    "backfill_user_search_fields", backfill_user_search_fields,
+    IntervalSchedule(hours=1), jitter_seconds=120, time_budget_seconds=600
+)
+scheduler.add_job(
+    "resume_export_jobs", resume_export_jobs,
+    IntervalSchedule(minutes=1), jitter_seconds=10, time_budget_seconds=60
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    # Maintenance runs in the background so request handlers never pay for it
+    scheduler.start()
+    bridge_task = asyncio.create_task(event_bridge.run())
+    yield
+    bridge_task.cancel()
+    await scheduler.stop()
+
+app = FastAPI(title="Spiritual App API", lifespan=lifespan)
+
+# Added before CORS so 429 responses still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,10 +80,6 @@ app.include_router(testimonials_router)
 app.include_router(admin_router)
 app.include_router(test_email_router)
 
-@app.on_event("startup")
-async def start_db():
-    await init_db()
-
 @app.get("/")
 def root():
     return {"message": "API is running"}
@@ -2,8 +2,9 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.security import OAuth2PasswordBearer
 from bson import ObjectId
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 import asyncio
+import os
 
 from database import (
     users_collection,
@@ -14,13 +15,23 @@ from database import (
     parishes_collection,
     db
 )
-from dependencies.auth import get_current_user
-from utils.permissions import require_permission
+from dependencies.auth import get_current_user, invalidate_user, user_cache
+from utils.permissions import require_permission, get_user_permissions, bump_role_version, permission_cache
+from utils.security import password_hasher
 from utils import hash_password
+from utils.pagination import KEYSET_SORT, keyset_filter, next_cursor, cached_total, total_cache
 from services.audit_service import log_admin_action
+from services.stats_service import (
+    get_dashboard_stats, bump_stats, prayer_removed, get_parish_member_counts, invalidate_parish_member_counts,
+    parish_member_cache
+)
+from services.analytics_rollups import query_rollups, rollup_watermark
+from services.user_search import (
+    HIDDEN_USER_FIELDS, name_search_fields, email_search_fields, search_filter, search_users
+)
 from data.role_presets import get_role_preset
-from core.admin_rate_limiter import limiter
 from pydantic import BaseModel
+from pymongo import ReturnDocument
 from fastapi import Request
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
@@ -71,14 +82,13 @@ class PrayerResponseUpdate(BaseModel):
 async def require_admin(user = Depends(get_current_user)):
     """Require admin privileges and return user object with permissions"""
     user_id = str(user["_id"])
-    # Check admin access permission
-    from utils.permissions import user_has_permission
-    has_admin = await user_has_permission(user_id, "admin_access")
-    if not has_admin:
+    # One cached lookup answers both checks
+    permissions = await get_user_permissions(user_id)
+    if "admin_access" not in permissions:
         raise HTTPException(status_code=403, detail="Admin access required")
 
     # Get user permissions
-    user["is_read_only_admin"] = await user_has_permission(user_id, "admin_read_only")
+    user["is_read_only_admin"] = "admin_read_only" in permissions
 
     user["id"] = str(user["_id"])
     del user["_id"]
@@ -102,87 +112,120 @@ async def get_current_admin(current_user: dict = Depends(require_admin)):
 @router.get("/dashboard")
 async def admin_dashboard(current_user: dict = Depends(require_admin)):
     try:
-        # Get total users count (not deleted)
-        total_users = await users_collection.count_documents({"is_deleted": {"$ne": True}})
-
-        # Get active users count (not deleted)
-        active_users = await users_collection.count_documents({"is_active": True, "is_deleted": {"$ne": True}})
-
-        # Get total prayers count (not deleted)
-        total_prayers = await prayers_collection.count_documents({"is_deleted": {"$ne": True}})
-
-        # Get prayers from last 30 days (not deleted)
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_prayers = await prayers_collection.count_documents({
-            "created_at": {"$gte": thirty_days_ago},
-            "is_deleted": {"$ne": True}
-        })
+        # Counters are kept current by the write paths and reconciled on a schedule,
+        # so the dashboard is a single document read
+        return await get_dashboard_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch dashboard data: {str(e)}")
 
-        # Get total parishes count (not deleted)
-        total_parishes = await parishes_collection.count_documents({"is_deleted": {"$ne": True}})
-        
-        # Get pending prayers (unanswered)
-        pending_prayers = await prayers_collection.count_documents({
-            # Prayer without responses
-        })
-        
-        # This is a simplified query - you'd need to check for prayers without responses
-        # For now, we'll use total prayers as pending
-        pending_prayers = total_prayers
-        
+# In-process caches reported by /admin/diagnostics
+DIAGNOSTIC_CACHES = {
+    "users": user_cache,
+    "permissions": permission_cache,
+    "listing_totals": total_cache,
+    "parish_member_counts": parish_member_cache
+}
+
+@router.get("/diagnostics")
+async def admin_diagnostics(current_user: dict = Depends(require_admin)):
+    """
+    Cache hit rates and bcrypt pool pressure for sizing TTLs and BCRYPT_WORKERS.
+
+    Every worker keeps its own counters since it started; the response comes
+    from whichever worker served the request, identified by pid.
+    """
+    return {
+        "worker_pid": os.getpid(),
+        "caches": {name: cache.stats() for name, cache in DIAGNOSTIC_CACHES.items()},
+        "password_hasher": password_hasher.stats()
+    }
+
+# Longest range an hourly series may cover
+MAX_HOURLY_RANGE = timedelta(days=31)
+
+@router.get("/analytics")
+async def get_analytics(
+    metric: Literal["prayers", "signups", "testimony_reactions"],
+    granularity: Literal["hour", "day", "week", "month"] = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    parish_id: Optional[str] = None,
+    current_user: dict = Depends(require_admin)
+):
+    """
+    Activity counts per bucket over [start, end), default the last 30 days.
+
+    Reads pre-aggregated rollup buckets only; "watermark" says how recent they are.
+    """
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if granularity == "hour" and end - start > MAX_HOURLY_RANGE:
+        raise HTTPException(status_code=400, detail="Hourly analytics are limited to 31 days")
+    try:
+        series = await query_rollups(metric, granularity, start, end, parish_id)
         return {
-            "total_users": total_users,
-            "active_users": active_users,
-            "total_prayers": total_prayers,
-            "recent_prayers": recent_prayers,
-            "total_parishes": total_parishes,
-            "pending_prayers": pending_prayers
+            "metric": metric,
+            "granularity": granularity,
+            "start": start,
+            "end": end,
+            "parish_id": parish_id,
+            "watermark": await rollup_watermark(metric),
+            "series": series
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch dashboard data: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch analytics: {str(e)}")
 
 # User Management
 @router.get("/users")
 async def get_all_users(
-    page: int = Query(1, ge=1),
+    after: Optional[str] = None,
     limit: int = Query(10, ge=1, le=100),
     search: Optional[str] = None,
     parish_id: Optional[str] = None,
     current_user: dict = Depends(require_admin)
 ):
+    """
+    Newest users first; pass next_cursor back as after for the following page.
+
+    With search, returns the best limit matches by relevance (email or name
+    word prefixes, served by indexes) and no next_cursor.
+    """
+    cursor_filter = keyset_filter(after)
     try:
         query = {"is_deleted": {"$ne": True}}
 
-        if search:
-            query["$or"] = [
-                {"full_name": {"$regex": search, "$options": "i"}},
-                {"email": {"$regex": search, "$options": "i"}}
-            ]
-
         if parish_id:
             query["parish_id"] = ObjectId(parish_id)
 
-        # Get users with pagination
-        skip = (page - 1) * limit
-        users_cursor = users_collection.find(query).skip(skip).limit(limit)
+        if search:
+            found = await search_users(users_collection, query, search, limit)
+            count_query = {**query, **search_filter(search)}
+        else:
+            # Keyset pagination: every page is an index seek, however deep
+            page_query = {**query, **cursor_filter}
+            # Don't expose passwords
+            users_cursor = users_collection.find(page_query, HIDDEN_USER_FIELDS).sort(KEYSET_SORT).limit(limit + 1)
+            found = await users_cursor.to_list(limit + 1)
+            count_query = query
         
         users = []
-        async for user in users_cursor:
+        for user in found:
             user["id"] = str(user["_id"])
             del user["_id"]
-            del user["password"]  # Don't expose passwords
             # Convert any remaining ObjectIds to strings
             user = convert_objectids_to_strings(user)
             users.append(user)
         
-        # Get total count for pagination
-        total = await users_collection.count_documents(query)
+        cursor = None if search else next_cursor(users, limit)
+        total = await cached_total(users_collection, count_query, (search, parish_id) if search or parish_id else ())
         
         return {
             "data": users,
             "total": total,
-            "page": page,
-            "limit": limit
+            "limit": limit,
+            "next_cursor": cursor
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch users: {str(e)}")
@@ -218,7 +261,6 @@ async def get_user_details(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch user details: {str(e)}")
 
-@limiter.limit("5/minute")
 @router.put("/users/{user_id}")
 async def update_user(
     user_id: str,
@@ -236,14 +278,27 @@ async def update_user(
                 update_data[field] = value
 
         update_data["updated_at"] = datetime.utcnow()
-
-        result = await users_collection.update_one(
+        updated_fields = list(update_data.keys())
+        # Search fields change in the same write, so search never sees a stale name or email
+        if "full_name" in update_data:
+            update_data.update(name_search_fields(update_data["full_name"]))
+        if "email" in update_data:
+            update_data.update(email_search_fields(update_data["email"]))
+
+        previous = await users_collection.find_one_and_update(
             {"_id": ObjectId(user_id)},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"is_active": 1, "parish_id": 1},
+            return_document=ReturnDocument.BEFORE
         )
 
-        if result.matched_count == 0:
+        if not previous:
             raise HTTPException(status_code=404, detail="User not found")
+        await invalidate_user(user_id)
+        if "parish_id" in update_data and str(update_data["parish_id"]) != str(previous.get("parish_id")):
+            await invalidate_parish_member_counts()
+        if "is_active" in update_data and bool(update_data["is_active"]) != bool(previous.get("is_active")):
+            await bump_stats(active_users=1 if update_data["is_active"] else -1)
 
         # Audit logging for user updates
         action = "USER_ACTIVATED" if user_data.is_active == True else "USER_DEACTIVATED" if user_data.is_active == False else "USER_UPDATED"
@@ -253,7 +308,7 @@ async def update_user(
             action=action,
             entity_type="User",
             entity_id=user_id,
-            metadata={"updated_fields": list(update_data.keys())},
+            metadata={"updated_fields": updated_fields},
             request=request
         )
 
@@ -266,10 +321,14 @@ async def delete_user(
     user_id: str,
     current_user: dict = Depends(require_admin)
 ):
-    result = await users_collection.delete_one({"_id": ObjectId(user_id)})
+    deleted = await users_collection.find_one_and_delete({"_id": ObjectId(user_id)}, projection={"is_active": 1, "parish_id": 1})
 
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="User not found")
+    await invalidate_user(user_id)
+    if deleted.get("parish_id"):
+        await invalidate_parish_member_counts()
+    await bump_stats(total_users=-1, active_users=-1 if deleted.get("is_active") else 0)
 
     return {"message": "User deleted permanently"}
 
@@ -316,6 +375,7 @@ async def create_role(
         }
 
         result = await roles_collection.insert_one(role_doc)
+        await bump_role_version()
 
         # Audit logging
         metadata = {
@@ -337,7 +397,6 @@ async def create_role(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create role: {str(e)}")
 
-@limiter.limit("5/minute")
 @router.put("/roles/{role_id}")
 async def update_role(
     role_id: str,
@@ -360,6 +419,7 @@ async def update_role(
 
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Role not found")
+        await bump_role_version()
 
         # Audit logging
         await log_admin_action(
@@ -376,7 +436,6 @@ async def update_role(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update role: {str(e)}")
 
-@limiter.limit("5/minute")
 @router.delete("/roles/{role_id}")
 async def delete_role(
     role_id: str,
@@ -392,6 +451,7 @@ async def delete_role(
 
         # Also remove role from users
         await user_roles_collection.delete_many({"role_id": ObjectId(role_id)})
+        await bump_role_version()
 
         # Audit logging
         await log_admin_action(
@@ -408,7 +468,6 @@ async def delete_role(
         raise HTTPException(status_code=500, detail=f"Failed to delete role: {str(e)}")
 
 # User Role Management
-@limiter.limit("5/minute")
 @router.post("/users/{user_id}/roles")
 async def assign_role_to_user(
     user_id: str,
@@ -434,6 +493,7 @@ async def assign_role_to_user(
         }
 
         await user_roles_collection.insert_one(user_role_doc)
+        await bump_role_version()
 
         # Audit logging
         await log_admin_action(
@@ -450,7 +510,6 @@ async def assign_role_to_user(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to assign role: {str(e)}")
 
-@limiter.limit("5/minute")
 @router.delete("/users/{user_id}/roles/{role_id}")
 async def remove_role_from_user(
     user_id: str,
@@ -467,6 +526,7 @@ async def remove_role_from_user(
 
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Role not found for user")
+        await bump_role_version()
 
         # Audit logging
         await log_admin_action(
@@ -484,51 +544,81 @@ async def remove_role_from_user(
         raise HTTPException(status_code=500, detail=f"Failed to remove role: {str(e)}")
 
 # Prayer Management
+
+# Moderation list filters; each is served by a (field, created_at, _id) index.
+# Responses are only soft-deleted along with their prayer, so response_count is the live
+# count the dashboard's pending_prayers uses; the page lookup skips deleted ones too.
+PRAYER_STATUS_FILTERS = {
+    # Prayers created before response_count existed have no field; $in null matches them
+    "pending": {"response_count": {"$in": [0, None]}},
+    "answered": {"response_count": {"$gt": 0}},
+    "approved": {"is_approved": True},
+    "unapproved": {"is_approved": False}
+}
+
+def admin_prayer_page_pipeline(query: dict, limit: int) -> list:
+    """One page of the moderation list with author and response count joined in a single round trip."""
+    return [
+        {"$match": query},
+        {"$sort": dict(KEYSET_SORT)},
+        # Limit before the lookups so only the rows on this page are joined
+        {"$limit": limit},
+        {"$lookup": {
+            "from": users_collection.name,
+            "localField": "user_id",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"_id": 0, "full_name": 1, "email": 1}}],
+            "as": "author"
+        }},
+        {"$lookup": {
+            "from": prayer_responses_collection.name,
+            "localField": "_id",
+            "foreignField": "prayer_id",
+            "pipeline": [{"$match": {"is_deleted": {"$ne": True}}}, {"$count": "count"}],
+            "as": "responses"
+        }},
+        {"$addFields": {
+            "id": {"$toString": "$_id"},
+            "user_name": {"$first": "$author.full_name"},
+            "user_email": {"$first": "$author.email"},
+            "response_count": {"$ifNull": [{"$first": "$responses.count"}, 0]}
+        }},
+        {"$project": {"_id": 0, "author": 0, "responses": 0}}
+    ]
+
 @router.get("/prayers")
 async def get_all_prayers(
-    page: int = Query(1, ge=1),
+    after: Optional[str] = None,
     limit: int = Query(10, ge=1, le=100),
-    status: Optional[str] = None,  # pending, answered, etc.
+    status: Optional[Literal["pending", "answered", "approved", "unapproved"]] = None,
     current_user: dict = Depends(require_admin)
 ):
+    """Newest prayers first; pass next_cursor back as after for the following page."""
+    cursor_filter = keyset_filter(after)
     try:
         query = {"is_deleted": {"$ne": True}}
-
-        prayers_cursor = prayers_collection.find(query).skip((page-1)*limit).limit(limit)
-        
-        prayers = []
-        async for prayer in prayers_cursor:
-            prayer["id"] = str(prayer["_id"])
-            del prayer["_id"]
-            
-            # Get user info
-            if prayer.get("user_id"):
-                user = await users_collection.find_one({"_id": prayer["user_id"]})
-                if user:
-                    prayer["user_name"] = user.get("full_name", "Unknown")
-                    prayer["user_email"] = user.get("email", "Unknown")
-            
-            # Get response count
-            response_count = await prayer_responses_collection.count_documents({
-                "prayer_id": ObjectId(prayer["id"])
-            })
-            prayer["response_count"] = response_count
-            
-            prayers.append(prayer)
+        if status:
+            query.update(PRAYER_STATUS_FILTERS[status])
+
+        pipeline = admin_prayer_page_pipeline({**query, **cursor_filter}, limit + 1)
+        prayers = [
+            convert_objectids_to_strings(prayer)
+            async for prayer in prayers_collection.aggregate(pipeline)
+        ]
         
-        total = await prayers_collection.count_documents(query)
+        cursor = next_cursor(prayers, limit)
+        total = await cached_total(prayers_collection, query, (status,) if status else ())
         
         return {
             "prayers": prayers,
             "total": total,
-            "page": page,
             "limit": limit,
-            "total_pages": (total + limit - 1) // limit
+            "total_pages": (total + limit - 1) // limit,
+            "next_cursor": cursor
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch prayers: {str(e)}")
 
-@limiter.limit("5/minute")
 @router.delete("/prayers/{prayer_id}")
 async def delete_prayer(
     prayer_id: str,
@@ -538,13 +628,18 @@ async def delete_prayer(
     check_read_only_admin(current_user)
     try:
         # Soft delete: mark as deleted
-        result = await prayers_collection.update_one(
-            {"_id": ObjectId(prayer_id)},
-            {"$set": {"is_deleted": True, "deleted_at": datetime.utcnow()}}
+        now = datetime.utcnow()
+        # updated_at too, so incremental exports pick up the tombstone
+        prayer = await prayers_collection.find_one_and_update(
+            {"_id": ObjectId(prayer_id), "is_deleted": {"$ne": True}},
+            {"$set": {"is_deleted": True, "deleted_at": now, "updated_at": now}},
+            projection={"created_at": 1}
         )
 
-        if result.matched_count == 0:
+        if not prayer:
             raise HTTPException(status_code=404, detail="Prayer not found")
+        # Before the responses go, so pending_prayers knows whether it was answered
+        await prayer_removed(prayer)
 
         # Also soft delete associated responses (or delete them)
         await prayer_responses_collection.update_many(
@@ -566,7 +661,6 @@ async def delete_prayer(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete prayer: {str(e)}")
 
-@limiter.limit("5/minute")
 @router.patch("/prayers/{prayer_id}")
 async def update_prayer(
     prayer_id: str,
@@ -605,7 +699,6 @@ async def update_prayer(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update prayer: {str(e)}")
 
-@limiter.limit("5/minute")
 @router.patch("/prayers/respond/{response_id}")
 async def update_prayer_response(
     response_id: str,
@@ -648,16 +741,14 @@ async def update_prayer_response(
 @router.get("/parishes")
 async def get_all_parishes(current_user: dict = Depends(require_admin)):
     try:
+        # Member counts for every parish come from one cached $group, not a count per parish
+        member_counts = await get_parish_member_counts()
         parishes_cursor = parishes_collection.find({"is_deleted": {"$ne": True}})
         parishes = []
         async for parish in parishes_cursor:
             parish["id"] = str(parish["_id"])
             del parish["_id"]
-
-            # Get user count for this parish (not deleted users)
-            user_count = await users_collection.count_documents({"parish_id": ObjectId(parish["id"]), "is_deleted": {"$ne": True}})
-            parish["user_count"] = user_count
-
+            parish["user_count"] = member_counts.get(parish["id"], 0)
             parishes.append(parish)
         return parishes
     except Exception as e:
@@ -684,6 +775,7 @@ async def create_parish(
         }
 
         result = await parishes_collection.insert_one(parish_doc)
+        await bump_stats(total_parishes=1)
 
         # Audit logging
         await log_admin_action(
@@ -700,7 +792,6 @@ async def create_parish(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create parish: {str(e)}")
 
-@limiter.limit("5/minute")
 @router.delete("/parishes/{parish_id}")
 async def delete_parish(
     parish_id: str,
@@ -710,13 +801,16 @@ async def delete_parish(
     check_read_only_admin(current_user)
     try:
         # Soft delete: mark as deleted
+        now = datetime.utcnow()
+        # updated_at too, so incremental exports pick up the tombstone
         result = await parishes_collection.update_one(
-            {"_id": ObjectId(parish_id)},
-            {"$set": {"is_deleted": True, "deleted_at": datetime.utcnow()}}
+            {"_id": ObjectId(parish_id), "is_deleted": {"$ne": True}},
+            {"$set": {"is_deleted": True, "deleted_at": now, "updated_at": now}}
         )
 
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Parish not found")
+        await bump_stats(total_parishes=-1)
 
         # Audit logging
         await log_admin_action(
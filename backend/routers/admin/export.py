@@ -1,100 +1,113 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-from database import users_collection, prayers_collection, parishes_collection
-from dependencies.auth import get_current_user
-from utils.permissions import require_permission
-import csv
-import io
-from bson import ObjectId
-from fastapi import Depends
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse, FileResponse
+from pydantic import BaseModel
+from .admin import require_admin
+from services.exporter import (
+    EXPORT_SOURCES, CHANGE_SORT, WATERMARK_LAG, export_cursor, export_query, export_columns, export_filename,
+    check_export_support, change_window, encode_watermark, stream_csv, stream_ndjson, stream_parquet,
+    compress_stream
+)
+from services.export_jobs import create_export_job, get_export_job, job_status, artifact_path
+from datetime import datetime
+from typing import Literal, Optional
+import os
 
 router = APIRouter(prefix="/export", tags=["Admin Export"])
 
-# Helper function to check admin access
-async def require_admin(user_id: str = Depends(get_current_user)):
-    has_admin = await require_permission(user_id, "admin_access")
-    if not has_admin:
-        raise HTTPException(status_code=403, detail="Admin access required")
+ExportSource = Literal["users", "prayers", "parishes"]
+ExportFormat = Literal["csv", "ndjson", "parquet"]
+ExportCompression = Literal["gzip", "zstd"]
 
-@router.get("/users")
-async def export_users(user_id: str = Depends(get_current_user)):
-    await require_admin(user_id)
-
-    # Fetch all non-deleted users
-    users_cursor = users_collection.find({"is_deleted": {"$ne": True}})
-    users = []
-    async for user in users_cursor:
-        user["id"] = str(user["_id"])
-        del user["_id"]
-        # Remove sensitive fields
-        user.pop("password", None)
-        users.append(user)
+class ExportJobCreate(BaseModel):
+    source: ExportSource
+    format: ExportFormat = "csv"
+    compression: Optional[ExportCompression] = None
 
-    # Create CSV
-    output = io.StringIO()
-    fieldnames = ["id", "full_name", "email", "mobile", "parish_id", "is_active", "is_verified", "created_at", "updated_at"]
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
-    for user in users:
-        writer.writerow(user)
+def export_response(name: str, format: str, compression: Optional[str], since: Optional[str]) -> StreamingResponse:
+    """
+    Stream a full export, or with since=<timestamp or watermark> only the
+    documents changed after it plus tombstones for soft-deleted ones.
 
-    output.seek(0)
+    X-Export-Watermark carries the value to pass as since on the next sync.
+    A full export's watermark is its start time, so the first incremental
+    sync overlaps it slightly rather than missing concurrent writes.
+    """
+    check_export_support(format, compression)
+    collection, columns = EXPORT_SOURCES[name]
+    since_at, until = change_window(since)
+    if since_at is None:
+        watermark = datetime.utcnow() - WATERMARK_LAG
+        cursor = export_cursor(collection, export_query(), columns)
+    else:
+        watermark = until
+        columns = export_columns(columns, incremental=True)
+        cursor = export_cursor(collection, export_query(since_at, until), columns, sort=CHANGE_SORT)
+    if format == "parquet":
+        stream = stream_parquet(cursor, columns, compression)
+    else:
+        stream = stream_ndjson(cursor, columns) if format == "ndjson" else stream_csv(cursor, columns)
+        if compression:
+            stream = compress_stream(stream, compression)
+    filename, media_type = export_filename(name, format, compression)
     return StreamingResponse(
-        io.StringIO(output.getvalue()),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=users.csv"}
+        stream,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-Export-Watermark": encode_watermark(watermark)
+        }
     )
 
-@router.get("/prayers")
-async def export_prayers(user_id: str = Depends(get_current_user)):
-    await require_admin(user_id)
-
-    # Fetch all non-deleted prayers
-    prayers_cursor = prayers_collection.find({"is_deleted": {"$ne": True}})
-    prayers = []
-    async for prayer in prayers_cursor:
-        prayer["id"] = str(prayer["_id"])
-        del prayer["_id"]
-        prayers.append(prayer)
-
-    # Create CSV
-    output = io.StringIO()
-    fieldnames = ["id", "user_id", "parish_id", "title", "content", "is_anonymous", "created_at", "updated_at"]
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
-    for prayer in prayers:
-        writer.writerow(prayer)
+@router.get("/users")
+async def export_users(
+    format: ExportFormat = "csv",
+    compression: Optional[ExportCompression] = None,
+    since: Optional[str] = None,
+    current_user: dict = Depends(require_admin)
+):
+    return export_response("users", format, compression, since)
 
-    output.seek(0)
-    return StreamingResponse(
-        io.StringIO(output.getvalue()),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=prayers.csv"}
-    )
+@router.get("/prayers")
+async def export_prayers(
+    format: ExportFormat = "csv",
+    compression: Optional[ExportCompression] = None,
+    since: Optional[str] = None,
+    current_user: dict = Depends(require_admin)
+):
+    return export_response("prayers", format, compression, since)
 
 @router.get("/parishes")
-async def export_parishes(user_id: str = Depends(get_current_user)):
-    await require_admin(user_id)
+async def export_parishes(
+    format: ExportFormat = "csv",
+    compression: Optional[ExportCompression] = None,
+    since: Optional[str] = None,
+    current_user: dict = Depends(require_admin)
+):
+    return export_response("parishes", format, compression, since)
 
-    # Fetch all non-deleted parishes
-    parishes_cursor = parishes_collection.find({"is_deleted": {"$ne": True}})
-    parishes = []
-    async for parish in parishes_cursor:
-        parish["id"] = str(parish["_id"])
-        del parish["_id"]
-        parishes.append(parish)
+@router.post("/jobs")
+async def start_export_job(data: ExportJobCreate, current_user: dict = Depends(require_admin)):
+    """Start a background export; poll its status and download the artifact once completed."""
+    check_export_support(data.format, data.compression)
+    job = await create_export_job(data.source, data.format, data.compression, current_user["id"])
+    return job_status(job)
 
-    # Create CSV
-    output = io.StringIO()
-    fieldnames = ["id", "name", "zone", "location", "created_at"]
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
-    for parish in parishes:
-        writer.writerow(parish)
+@router.get("/jobs/{job_id}")
+async def get_export_job_status(job_id: str, current_user: dict = Depends(require_admin)):
+    job = await get_export_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job_status(job)
 
-    output.seek(0)
-    return StreamingResponse(
-        io.StringIO(output.getvalue()),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=parishes.csv"}
-    )
\ No newline at end of file
+@router.get("/jobs/{job_id}/download")
+async def download_export_job(job_id: str, current_user: dict = Depends(require_admin)):
+    """Serve a finished artifact; FileResponse honours Range headers, so interrupted downloads resume."""
+    job = await get_export_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Export job is {job['status']}")
+    path = artifact_path(job)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export artifact is no longer available")
+    return FileResponse(path, media_type=job["media_type"], filename=job["file_name"])
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Header
+from fastapi.responses import StreamingResponse
 from database import prayers_collection, prayer_responses_collection, users_collection
 from datetime import datetime, timedelta
 from bson import ObjectId
 from typing import Optional
 from models.prayer import PrayerCreate
 from models.prayer_response import PrayerResponseCreate
-from dependencies.auth import get_current_user
+from dependencies.auth import get_current_user, verify_stream_token
 from utils.permissions import require_permission
+from core.broadcaster import TopicBroadcaster, sse_stream
+from core.event_bridge import event_bridge
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, KEYSET_SORT, keyset_filter, next_cursor
+from services.stats_service import prayer_added, prayer_removed, response_added
 
 def convert_objectids(obj):
     if isinstance(obj, ObjectId):
@@ -20,40 +25,72 @@ def convert_objectids(obj):
 
 router = APIRouter(prefix="/api/prayers", tags=["Prayers"])
 
+# One stream per open prayer thread, fed by respond_to_prayer on any worker
+prayer_thread_broadcaster = TopicBroadcaster("prayer_id", max_queue_size=50, history_size=100)
+event_bridge.register("prayer_threads", prayer_thread_broadcaster)
+
+# Fields the prayer wall renders; everything else stays on the server
+PRAYER_WALL_PROJECTION = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "title": 1,
+    "content": 1,
+    "created_at": 1,
+    "expires_at": 1,
+    "is_anonymous": 1,
+    "is_approved": 1,
+    "requestText": "$content",
+    "createdAt": "$created_at",
+    "approved": {"$ifNull": ["$is_approved", True]},
+    "anonymous": {"$ifNull": ["$is_anonymous", False]},
+    "userName": {
+        "$cond": [
+            {"$ifNull": ["$is_anonymous", False]},
+            "Anonymous",
+            {"$ifNull": [{"$first": "$author.full_name"}, "Unknown"]}
+        ]
+    }
+}
+
+def prayer_wall_pipeline(query: dict, limit: Optional[int] = None) -> list:
+    """Build the prayer wall aggregation: match, sort, author lookup and projection in one round trip."""
+    pipeline = [
+        {"$match": query},
+        {"$sort": dict(KEYSET_SORT)}
+    ]
+    if limit:
+        # Limit before the lookup so only the rows on this page are joined
+        pipeline.append({"$limit": limit})
+    return pipeline + [
+        {"$lookup": {
+            "from": users_collection.name,
+            "localField": "user_id",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"_id": 0, "full_name": 1}}],
+            "as": "author"
+        }},
+        {"$project": PRAYER_WALL_PROJECTION}
+    ]
+
 @router.get("/")
 async def get_prayers(
     parish_id: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     user = Depends(get_current_user)
 ):
-    user_id = str(user["_id"])
+    query = {
+        "is_approved": True,
+        "expires_at": {"$gt": datetime.utcnow()},
+        **keyset_filter(after)
+    }
     try:
-        query = {
-            "is_approved": True,
-            "expires_at": {"$gt": datetime.utcnow()}
-        }
         if parish_id:
             query["parish_id"] = ObjectId(parish_id)
-        prayers_cursor = prayers_collection.find(query).sort("created_at", -1)
-        prayers = []
-        async for p in prayers_cursor:
-            p["id"] = str(p["_id"])
-            del p["_id"]
-            # Add userName
-            if p.get("is_anonymous", False):
-                p["userName"] = "Anonymous"
-            else:
-                user = await users_collection.find_one({"_id": ObjectId(p["user_id"])})
-                p["userName"] = user.get("full_name", "Unknown") if user else "Unknown"
-            # Map fields
-            p["requestText"] = p["content"]
-            p["createdAt"] = p["created_at"]
-            p["approved"] = p.get("is_approved", True)
-            p["anonymous"] = p.get("is_anonymous", False)
-            # Remove ObjectId fields that can't be serialized
-            p.pop("user_id", None)
-            p.pop("parish_id", None)
-            prayers.append(p)
-        return {"success": True, "data": convert_objectids(prayers)}
+        pipeline = prayer_wall_pipeline(query, limit=limit + 1)
+        prayers = await prayers_collection.aggregate(pipeline).to_list(length=None)
+        cursor = next_cursor(prayers, limit)
+        return {"success": True, "data": convert_objectids(prayers), "next_cursor": cursor}
     except Exception as e:
         print(e)
         return {"success": False, "message": "Failed to fetch prayers"}
@@ -77,12 +114,15 @@ async def create_prayer(
             "is_approved": True,
             "created_at": now,
             "expires_at": now + timedelta(hours=24),
-            "updated_at": datetime.utcnow()
+            "updated_at": datetime.utcnow(),
+            # Kept by respond_to_prayer; backs the admin pending/answered filters
+            "response_count": 0
         }
         if prayer.parish_id:
             prayer_doc["parish_id"] = ObjectId(prayer.parish_id)
 
         result = await prayers_collection.insert_one(prayer_doc)
+        await prayer_added()
         return {"message": "Prayer submitted successfully"}
     except Exception as e:
         print(e)
@@ -176,9 +216,12 @@ async def respond_to_prayer(
 
     result = await prayer_responses_collection.insert_one(new_response)
     new_response["id"] = str(result.inserted_id)
+    await prayers_collection.update_one({"_id": new_response["prayer_id"]}, {"$inc": {"response_count": 1}})
+    await response_added(new_response["prayer_id"])
 
     # Map response for frontend
     response_data = {
+        "id": new_response["id"],
         "userName": new_response.get("author_name") or "Anonymous",
         "responseText": new_response["message"],
         "time": new_response["created_at"],
@@ -186,8 +229,34 @@ async def respond_to_prayer(
         "anonymous": not new_response.get("author_name")
     }
 
+    # Push to everyone watching this thread instead of making them poll
+    await event_bridge.publish("prayer_threads", {
+        "type": "prayer_response_added",
+        "prayer_id": prayer_id,
+        "response": response_data
+    })
+
     return {"success": True, "message": "Response added", "response": response_data}
 
+@router.get("/stream/{prayer_id}")
+async def stream_prayer_thread(
+    prayer_id: str,
+    token: str = None,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    # For SSE, auth via query param since EventSource can't send headers
+    verify_stream_token(token)
+    prayer = await prayers_collection.find_one(
+        {"_id": ObjectId(prayer_id), "is_approved": True, "expires_at": {"$gt": datetime.utcnow()}},
+        {"_id": 1}
+    )
+    if not prayer:
+        raise HTTPException(status_code=404, detail="Prayer request has expired or does not exist")
+    resume_from = last_event_id_header or last_event_id
+    subscription = prayer_thread_broadcaster.subscribe(prayer_id, last_event_id=resume_from)
+    return StreamingResponse(sse_stream(subscription), media_type="text/event-stream")
+
 @router.get("/my-prayers")
 async def get_my_prayers(user = Depends(get_current_user)):
     user_id = str(user["_id"])
@@ -215,7 +284,9 @@ async def delete_prayer(prayer_id: str, user = Depends(get_current_user)):
         prayer = await prayers_collection.find_one({"_id": ObjectId(prayer_id), "user_id": ObjectId(user_id)})
         if not prayer:
             raise HTTPException(status_code=404, detail="Prayer not found or not owned by user")
-        await prayers_collection.delete_one({"_id": ObjectId(prayer_id)})
+        result = await prayers_collection.delete_one({"_id": ObjectId(prayer_id)})
+        if result.deleted_count and not prayer.get("is_deleted"):
+            await prayer_removed(prayer)
         return {"success": True, "message": "Prayer deleted"}
     except Exception as e:
         print(e)
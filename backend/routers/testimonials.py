@@ -1,25 +1,28 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Header
 from fastapi.responses import StreamingResponse
 from database import testimonies_collection, testimony_reactions_collection, notifications_collection, users_collection
 from datetime import datetime, timedelta
 from bson import ObjectId
 from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
 from models.testimony import TestimonyCreate
 from models.testimony_reaction import TestimonyReactionCreate
 from models.notification import NotificationCreate
-from dependencies.auth import get_current_user
+from services.reaction_service import REACTION_TYPES, empty_reaction_counts, apply_reaction_delta
+from dependencies.auth import get_current_user, verify_stream_token
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, KEYSET_SORT, keyset_filter, next_cursor
+from typing import Optional
 import asyncio
 import json
-from jose import JWTError, jwt
-from utils.security import SECRET_KEY, ALGORITHM
+from core.broadcaster import EventBroadcaster, sse_stream
+from core.event_bridge import event_bridge
 
 router = APIRouter(prefix="/api/testimonies", tags=["Testimonies"])
 
-# Global event queue for SSE
-testimony_event_queue = asyncio.Queue()
-
-# Global for cleanup tracking
-last_cleanup = None
+# Fan-out hub for SSE; every /stream connection gets its own bounded queue
+testimony_broadcaster = EventBroadcaster(max_queue_size=100)
+# Events published on other workers reach this worker's subscribers through the bridge
+event_bridge.register("testimonies", testimony_broadcaster)
 
 def convert_objectids(obj):
     if isinstance(obj, ObjectId):
@@ -31,57 +34,53 @@ def convert_objectids(obj):
     else:
         return obj
 
-async def cleanup_expired_testimonies():
-    global last_cleanup
-    now = datetime.utcnow()
-    if last_cleanup is None or (now - last_cleanup) > timedelta(hours=1):
-        # Delete expired testimonies
-        expired_testimonies = testimonies_collection.find({"expires_at": {"$lt": now}})
-        expired_ids = []
-        async for t in expired_testimonies:
-            expired_ids.append(t["_id"])
-        if expired_ids:
-            # Delete reactions and notifications
-            for tid in expired_ids:
-                tid_str = str(tid)
-                await testimony_reactions_collection.delete_many({"testimony_id": tid_str})
-                await notifications_collection.delete_many({"related_id": tid_str})
-            # Delete testimonies
-            await testimonies_collection.delete_many({"_id": {"$in": expired_ids}})
-            print(f"Deleted {len(expired_ids)} expired testimonies")
-        last_cleanup = now
+async def get_author_names(testimonies: list) -> dict:
+    """Resolve full names for every non-anonymous author on a page in one query."""
+    author_ids = {ObjectId(t["user_id"]) for t in testimonies if not t.get("is_anonymous", False)}
+    if not author_ids:
+        return {}
+    users_cursor = users_collection.find({"_id": {"$in": list(author_ids)}}, {"full_name": 1})
+    return {str(u["_id"]): u.get("full_name", "Unknown") async for u in users_cursor}
+
+async def get_user_reactions(testimony_ids: list, user_id: str) -> dict:
+    """Look up the caller's own reaction for a page of testimonies with one indexed query."""
+    reactions_cursor = testimony_reactions_collection.find(
+        {"user_id": user_id, "testimony_id": {"$in": testimony_ids}, "is_deleted": {"$ne": True}},
+        {"testimony_id": 1, "reaction": 1}
+    )
+    return {r["testimony_id"]: r["reaction"] async for r in reactions_cursor}
+
+async def enrich_testimonies(testimonies: list, user_id: str) -> list:
+    """Add id, userName, reactions and userReaction to raw testimony documents in place."""
+    for t in testimonies:
+        t["id"] = str(t.pop("_id"))
+    author_names = await get_author_names(testimonies)
+    user_reactions = await get_user_reactions([t["id"] for t in testimonies], user_id)
+    for t in testimonies:
+        if t.get("is_anonymous", False):
+            t["userName"] = "Anonymous"
+        else:
+            t["userName"] = author_names.get(t["user_id"], "Unknown")
+        # Counters are maintained on the testimony itself by react_to_testimony
+        stored = t.get("reactions") or {}
+        t["reactions"] = {reaction: stored.get(reaction, 0) for reaction in REACTION_TYPES}
+        t["userReaction"] = user_reactions.get(t["id"])
+    return testimonies
 
 @router.get("/")
-async def get_all_testimonies(user = Depends(get_current_user)):
+async def get_all_testimonies(
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user = Depends(get_current_user)
+):
     user_id = str(user["_id"])
+    query = {"is_deleted": {"$ne": True}, **keyset_filter(after)}
     try:
-        await cleanup_expired_testimonies()
-        testimonies_cursor = testimonies_collection.find({"is_deleted": {"$ne": True}}).sort("created_at", -1)
-        testimonies = []
-        count = 0
-        async for t in testimonies_cursor:
-            count += 1
-            t["id"] = str(t["_id"])
-            del t["_id"]
-            # Add userName
-            if t.get("is_anonymous", False):
-                t["userName"] = "Anonymous"
-            else:
-                user = await users_collection.find_one({"_id": ObjectId(t["user_id"])})
-                t["userName"] = user.get("full_name", "Unknown") if user else "Unknown"
-            # Add reactions
-            reactions_cursor = testimony_reactions_collection.find({"testimony_id": t["id"], "is_deleted": {"$ne": True}})
-            reaction_counts = {"praise": 0, "amen": 0, "thanks": 0}
-            user_reaction = None
-            async for r in reactions_cursor:
-                reaction_counts[r["reaction"]] += 1
-                if r["user_id"] == user_id:
-                    user_reaction = r["reaction"]
-            t["reactions"] = reaction_counts
-            t["userReaction"] = user_reaction
-            testimonies.append(t)
-        print(f"Found {count} my testimonies for user {user_id}")
-        return {"success": True, "data": convert_objectids(testimonies)}
+        testimonies_cursor = testimonies_collection.find(query).sort(KEYSET_SORT).limit(limit + 1)
+        testimonies = await enrich_testimonies(await testimonies_cursor.to_list(length=None), user_id)
+        cursor = next_cursor(testimonies, limit)
+        print(f"Found {len(testimonies)} testimonies for user {user_id}")
+        return {"success": True, "data": convert_objectids(testimonies), "next_cursor": cursor}
     except Exception as e:
         print(e)
         return {"success": False, "message": "Failed to fetch testimonies"}
@@ -91,32 +90,9 @@ async def get_my_testimonies(user = Depends(get_current_user)):
     user_id = str(user["_id"])
     try:
         print(f"DEBUG: get_my_testimonies for user_id: {user_id}")
-        await cleanup_expired_testimonies()
         testimonies_cursor = testimonies_collection.find({"user_id": user_id, "expires_at": {"$gt": datetime.utcnow()}, "is_deleted": {"$ne": True}}).sort("created_at", -1)
-        testimonies = []
-        count = 0
-        async for t in testimonies_cursor:
-            count += 1
-            t["id"] = str(t["_id"])
-            del t["_id"]
-            # Add userName
-            if t.get("is_anonymous", False):
-                t["userName"] = "Anonymous"
-            else:
-                user = await users_collection.find_one({"_id": ObjectId(t["user_id"])})
-                t["userName"] = user.get("full_name", "Unknown") if user else "Unknown"
-            # Add reactions
-            reactions_cursor = testimony_reactions_collection.find({"testimony_id": t["id"], "is_deleted": {"$ne": True}})
-            reaction_counts = {"praise": 0, "amen": 0, "thanks": 0}
-            user_reaction = None
-            async for r in reactions_cursor:
-                reaction_counts[r["reaction"]] += 1
-                if r["user_id"] == user_id:
-                    user_reaction = r["reaction"]
-            t["reactions"] = reaction_counts
-            t["userReaction"] = user_reaction
-            testimonies.append(t)
-        print(f"DEBUG: Found {count} testimonies for user {user_id}")
+        testimonies = await enrich_testimonies(await testimonies_cursor.to_list(length=None), user_id)
+        print(f"DEBUG: Found {len(testimonies)} testimonies for user {user_id}")
         return {"success": True, "data": convert_objectids(testimonies)}
     except Exception as e:
         print(f"DEBUG: Error in get_my_testimonies: {e}")
@@ -136,6 +112,7 @@ async def create_testimony(
             "user_id": user_id,
             "content": testimony.content,
             "is_anonymous": testimony.is_anonymous,
+            "reactions": empty_reaction_counts(),
             "created_at": now,
             "expires_at": now + timedelta(hours=24)
         }
@@ -152,13 +129,11 @@ async def create_testimony(
         else:
             user = await users_collection.find_one({"_id": ObjectId(testimony["user_id"])})
             testimony["userName"] = user.get("full_name", "Unknown") if user else "Unknown"
-        # Add reactions
-        testimony["reactions"] = {"praise": 0, "amen": 0, "thanks": 0}
         testimony["userReaction"] = None
         testimony.pop("user_id", None)
 
         # Broadcast event
-        await testimony_event_queue.put({
+        await event_bridge.publish("testimonies", {
             "type": "testimony_added",
             "testimony": convert_objectids(testimony)
         })
@@ -168,6 +143,19 @@ async def create_testimony(
         print(e)
         return {"success": False, "message": "Failed to create testimony"}
 
+@router.get("/stream")
+async def stream_testimony_events(
+    token: str = None,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    # For SSE, auth via query param since EventSource can't send headers
+    verify_stream_token(token)
+    # EventSource resends the last id as a header on reconnect; manual clients may use the query param
+    resume_from = last_event_id_header or last_event_id
+    subscription = testimony_broadcaster.subscribe(last_event_id=resume_from)
+    return StreamingResponse(sse_stream(subscription), media_type="text/event-stream")
+
 @router.get("/{testimony_id}")
 async def get_testimony(testimony_id: str, user = Depends(get_current_user)):
     user_id = str(user["_id"])
@@ -175,24 +163,7 @@ async def get_testimony(testimony_id: str, user = Depends(get_current_user)):
     if not testimony:
         raise HTTPException(status_code=404, detail="Testimony not found")
 
-    testimony["id"] = str(testimony["_id"])
-    del testimony["_id"]
-    # Add userName
-    if testimony.get("is_anonymous", False):
-        testimony["userName"] = "Anonymous"
-    else:
-        user = await users_collection.find_one({"_id": ObjectId(testimony["user_id"])})
-        testimony["userName"] = user.get("full_name", "Unknown") if user else "Unknown"
-    # Add reactions
-    reactions_cursor = testimony_reactions_collection.find({"testimony_id": testimony["id"], "is_deleted": {"$ne": True}})
-    reaction_counts = {"praise": 0, "amen": 0, "thanks": 0}
-    user_reaction = None
-    async for r in reactions_cursor:
-        reaction_counts[r["reaction"]] += 1
-        if r["user_id"] == user_id:
-            user_reaction = r["reaction"]
-    testimony["reactions"] = reaction_counts
-    testimony["userReaction"] = user_reaction
+    await enrich_testimonies([testimony], user_id)
     # Remove ObjectId fields
     testimony.pop("user_id", None)
     return {"success": True, "testimony": convert_objectids(testimony)}
@@ -225,8 +196,13 @@ async def react_to_testimony(
                 "reaction": payload.reaction,
                 "created_at": datetime.utcnow()
             }
-            await testimony_reactions_collection.insert_one(reaction_doc)
-            await testimony_event_queue.put({
+            try:
+                await testimony_reactions_collection.insert_one(reaction_doc)
+            except DuplicateKeyError:
+                # A concurrent request (e.g. a double click) already added it and bumped the counter
+                return {"success": True, "message": "Reaction added"}
+            await apply_reaction_delta(testimony_id, {payload.reaction: 1})
+            await event_bridge.publish("testimonies", {
                 "type": "testimony_reaction_added",
                 "testimony_id": testimony_id,
                 "reaction": payload.reaction,
@@ -251,10 +227,13 @@ async def react_to_testimony(
             return {"success": True, "message": "Reaction added"}
         elif existing["reaction"] == payload.reaction:
             # Same reaction: remove it
-            await testimony_reactions_collection.delete_one({
+            result = await testimony_reactions_collection.delete_one({
                 "_id": existing["_id"]
             })
-            await testimony_event_queue.put({
+            # Only the request that actually removed the reaction decrements the counter
+            if result.deleted_count:
+                await apply_reaction_delta(testimony_id, {existing["reaction"]: -1})
+            await event_bridge.publish("testimonies", {
                 "type": "testimony_reaction_removed",
                 "testimony_id": testimony_id,
                 "reaction": existing["reaction"],
@@ -264,11 +243,13 @@ async def react_to_testimony(
         else:
             # Different reaction: update it
             old_reaction = existing["reaction"]
-            await testimony_reactions_collection.update_one(
-                {"_id": existing["_id"]},
+            result = await testimony_reactions_collection.update_one(
+                {"_id": existing["_id"], "reaction": old_reaction},
                 {"$set": {"reaction": payload.reaction}}
             )
-            await testimony_event_queue.put({
+            if result.modified_count:
+                await apply_reaction_delta(testimony_id, {old_reaction: -1, payload.reaction: 1})
+            await event_bridge.publish("testimonies", {
                 "type": "testimony_reaction_updated",
                 "testimony_id": testimony_id,
                 "old_reaction": old_reaction,
@@ -281,30 +262,6 @@ async def react_to_testimony(
         print(e)
         return {"success": False, "message": "Failed to process reaction"}
 
-@router.get("/stream")
-async def stream_testimony_events(token: str = None):
-    # For SSE, auth via query param since EventSource can't send headers
-    if not token:
-        raise HTTPException(status_code=401, detail="Token required")
-    # Manually verify token
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    async def event_generator():
-        while True:
-            try:
-                event = await asyncio.wait_for(testimony_event_queue.get(), timeout=60)
-                yield f"data: {json.dumps(event)}\n\n"
-            except asyncio.TimeoutError:
-                # Send keep-alive
-                yield "data: {\"type\": \"ping\"}\n\n"
-
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
-
 @router.delete("/{testimony_id}")
 async def delete_testimony(
     testimony_id: str,
@@ -330,7 +287,7 @@ async def delete_testimony(
     await testimonies_collection.delete_one({"_id": tid})
 
     # Emit SSE delete event
-    await testimony_event_queue.put({
+    await event_bridge.publish("testimonies", {
         "type": "testimony_deleted",
         "testimony_id": testimony_id
     })
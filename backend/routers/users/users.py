@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from database import users_collection, parishes_collection
-from dependencies.auth import get_current_user
+from dependencies.auth import get_current_user, invalidate_user
 from utils.permissions import require_permission
-from utils.security import hash_password, verify_password
+from utils.security import password_hasher
 from bson import ObjectId
 from pydantic import BaseModel
 from services.email_service import send_email
+from services.stats_service import bump_stats
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -50,14 +51,15 @@ async def all_users(user = Depends(get_current_user)):
 @router.put("/change-password")
 async def change_password(data: ChangePasswordSchema, user = Depends(get_current_user)):
 
-    if not verify_password(data.current_password, user["password"]):
+    if not await password_hasher.verify(data.current_password, user["password"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
 
-    hashed_pw = hash_password(data.new_password)
+    hashed_pw = await password_hasher.hash(data.new_password)
     await users_collection.update_one(
         {"_id": user["_id"]},
         {"$set": {"password": hashed_pw}}
     )
+    await invalidate_user(user["_id"])
 
     # Send password change alert email
     try:
@@ -90,5 +92,8 @@ async def delete_my_account(user = Depends(get_current_user)):
         except Exception as e:
             print(f"Failed to send account deletion email: {e}")
 
-    await users_collection.delete_one({"_id": user["_id"]})
+    result = await users_collection.delete_one({"_id": user["_id"]})
+    await invalidate_user(user["_id"])
+    if result.deleted_count:
+        await bump_stats(total_users=-1, active_users=-1 if user.get("is_active") else 0)
     return {"message": "Your account has been deleted"}
\ No newline at end of file
@@ -0,0 +1,155 @@
+from database import (
+    activity_rollups_collection, rollup_watermarks_collection,
+    prayers_collection, users_collection, testimony_reactions_collection
+)
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+# metric -> (source collection, parish field or None for metrics with no parish)
+ROLLUP_METRICS = {
+    "prayers": (prayers_collection, "parish_id"),
+    "signups": (users_collection, "parish_id"),
+    "testimony_reactions": (testimony_reactions_collection, None),
+}
+# Bucket parish key for activity with no parish; $merge keys cannot be null
+NO_PARISH = "none"
+
+# Stay behind "now" so documents still being written land in the next run
+ROLLUP_LAG = timedelta(seconds=30)
+# Catch-up after downtime or the first run proceeds at most this far per run
+ROLLUP_MAX_WINDOW = timedelta(days=7)
+
+def floor_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def floor_day(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _merge_stage() -> dict:
+    return {"$merge": {
+        "into": activity_rollups_collection.name,
+        "on": ["metric", "granularity", "parish_id", "bucket_start"],
+        "whenMatched": "replace",
+        "whenNotMatched": "insert"
+    }}
+
+def hourly_pipeline(metric: str, parish_field: Optional[str], start: datetime, end: datetime) -> list:
+    """Count source documents per (parish, hour) for every hour overlapping [start, end)."""
+    return [
+        {"$match": {"created_at": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {
+                # Parish ids are stored as ObjectIds or strings depending on the write path
+                "parish_id": {"$ifNull": [{"$toString": f"${parish_field}"}, NO_PARISH]} if parish_field else NO_PARISH,
+                "bucket_start": {"$dateTrunc": {"date": "$created_at", "unit": "hour"}}
+            },
+            "count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "metric": {"$literal": metric},
+            "granularity": {"$literal": "hour"},
+            "parish_id": "$_id.parish_id",
+            "bucket_start": "$_id.bucket_start",
+            "count": 1,
+            "rolled_up_at": {"$literal": datetime.utcnow()}
+        }},
+        _merge_stage()
+    ]
+
+def daily_pipeline(metric: str, start: datetime, end: datetime) -> list:
+    """Sum hourly buckets into daily ones, so days stay correct after raw documents expire."""
+    return [
+        {"$match": {"metric": metric, "granularity": "hour", "bucket_start": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {
+                "parish_id": "$parish_id",
+                "bucket_start": {"$dateTrunc": {"date": "$bucket_start", "unit": "day"}}
+            },
+            "count": {"$sum": "$count"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "metric": {"$literal": metric},
+            "granularity": {"$literal": "day"},
+            "parish_id": "$_id.parish_id",
+            "bucket_start": "$_id.bucket_start",
+            "count": 1,
+            "rolled_up_at": {"$literal": datetime.utcnow()}
+        }},
+        _merge_stage()
+    ]
+
+async def _first_event_at(collection) -> Optional[datetime]:
+    first = await collection.find_one({"created_at": {"$ne": None}}, {"created_at": 1}, sort=[("created_at", 1)])
+    return first["created_at"] if first else None
+
+async def rollup_metric(metric: str, now: Optional[datetime] = None) -> dict:
+    """
+    Bring one metric's buckets up to date from its watermark.
+
+    Every run recomputes whole buckets from the start of the watermark's hour
+    (and day) and replaces them, so rerunning after a crash between the
+    $merge and the watermark update cannot double count.
+    """
+    collection, parish_field = ROLLUP_METRICS[metric]
+    state = await rollup_watermarks_collection.find_one({"_id": metric})
+    watermark = state["watermark"] if state else await _first_event_at(collection)
+    until = (now or datetime.utcnow()) - ROLLUP_LAG
+    if watermark is None or watermark >= until:
+        return {"metric": metric, "watermark": watermark, "skipped": True}
+    until = min(until, watermark + ROLLUP_MAX_WINDOW)
+
+    hour_start = floor_hour(watermark)
+    await collection.aggregate(hourly_pipeline(metric, parish_field, hour_start, until)).to_list(None)
+    day_start = floor_day(watermark)
+    await activity_rollups_collection.aggregate(daily_pipeline(metric, day_start, until)).to_list(None)
+
+    await rollup_watermarks_collection.update_one(
+        {"_id": metric},
+        {"$set": {"watermark": until, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return {"metric": metric, "from": hour_start, "watermark": until, "skipped": False}
+
+async def rollup_activity() -> List[dict]:
+    """Scheduled job: advance every metric; one failing metric does not hold back the rest."""
+    results = []
+    for metric in ROLLUP_METRICS:
+        try:
+            results.append(await rollup_metric(metric))
+        except Exception as e:
+            print(f"Activity rollup for {metric} failed: {e}")
+            results.append({"metric": metric, "error": str(e)})
+    return results
+
+async def query_rollups(metric: str, granularity: str, start: datetime, end: datetime,
+                        parish_id=None) -> List[dict]:
+    """
+    Time series for [start, end) read only from pre-aggregated buckets.
+
+    Hourly and daily series read their own buckets; weekly and monthly ones are
+    summed from daily buckets. Without parish_id, parishes are added together;
+    parish_id is the parish's id string, or NO_PARISH.
+    """
+    source = "hour" if granularity == "hour" else "day"
+    match = {"metric": metric, "granularity": source, "bucket_start": {"$gte": start, "$lt": end}}
+    if parish_id is not None:
+        match["parish_id"] = parish_id
+    if granularity == "week":
+        bucket = {"$dateTrunc": {"date": "$bucket_start", "unit": "week", "startOfWeek": "monday"}}
+    elif granularity == "month":
+        bucket = {"$dateTrunc": {"date": "$bucket_start", "unit": "month"}}
+    else:
+        bucket = "$bucket_start"
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": bucket, "count": {"$sum": "$count"}}},
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "bucket_start": "$_id", "count": 1}}
+    ]
+    return await activity_rollups_collection.aggregate(pipeline).to_list(None)
+
+async def rollup_watermark(metric: str) -> Optional[datetime]:
+    state = await rollup_watermarks_collection.find_one({"_id": metric})
+    return state["watermark"] if state else None
@@ -0,0 +1,48 @@
+from database import pending_users_collection, password_reset_tokens_collection
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from typing import Optional
+import uuid
+
+# Indexes backing these lookups are created in database.init_db:
+#   pending_users: unique (email, otp), TTL on otp_expires
+#   password_reset_tokens: unique token, TTL on expires_at
+
+OTP_LIFETIME = timedelta(minutes=10)
+RESET_TOKEN_LIFETIME = timedelta(minutes=15)
+
+async def save_pending_signup(signup: dict) -> dict:
+    """Store (or replace) the single pending signup for an email in one upsert."""
+    now = datetime.utcnow()
+    signup = {**signup, "otp_expires": now + OTP_LIFETIME, "created_at": now}
+    return await pending_users_collection.find_one_and_replace(
+        {"email": signup["email"]},
+        signup,
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+async def find_pending_signup(email: str, otp: str) -> Optional[dict]:
+    """Point lookup on the (email, otp) index; never scans."""
+    return await pending_users_collection.find_one({"email": email, "otp": otp})
+
+async def delete_pending_signup(signup_id):
+    await pending_users_collection.delete_one({"_id": signup_id})
+
+async def create_reset_token(user_id: str) -> str:
+    now = datetime.utcnow()
+    token = str(uuid.uuid4())
+    await password_reset_tokens_collection.insert_one({
+        "user_id": user_id,
+        "token": token,
+        "expires_at": now + RESET_TOKEN_LIFETIME,
+        "created_at": now
+    })
+    return token
+
+async def consume_reset_token(token: str) -> Optional[dict]:
+    """Atomically fetch and delete an unexpired reset token, so each token works exactly once."""
+    return await password_reset_tokens_collection.find_one_and_delete({
+        "token": token,
+        "expires_at": {"$gt": datetime.utcnow()}
+    })
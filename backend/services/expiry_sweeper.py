@@ -0,0 +1,78 @@
+from database import testimonies_collection, testimony_reactions_collection, notifications_collection
+from datetime import datetime
+from bson import ObjectId
+import time
+
+SWEEP_BATCH_SIZE = 500
+SWEEP_TIME_BUDGET_SECONDS = 20
+
+# Summary of the most recent sweep, for logs and admin diagnostics
+last_sweep = None
+
+async def sweep_expired_testimonies(batch_size: int = SWEEP_BATCH_SIZE, time_budget_seconds: float = SWEEP_TIME_BUDGET_SECONDS) -> dict:
+    """
+    Delete expired testimonies together with their reactions and notifications.
+
+    Works in batches of batch_size ids using $in deletes and stops once the time
+    budget is spent; whatever is left is picked up by the next run. Also removes
+    reactions and notifications whose testimony the TTL index already deleted.
+
+    Returns:
+        Counts of deleted documents per collection, duration and whether the sweep finished
+    """
+    started = time.monotonic()
+    deadline = started + time_budget_seconds
+    deleted = {"testimonies": 0, "reactions": 0, "notifications": 0}
+    now = datetime.utcnow()
+
+    complete = False
+    while time.monotonic() < deadline:
+        expired_cursor = testimonies_collection.find({"expires_at": {"$lt": now}}, {"_id": 1}).limit(batch_size)
+        expired_ids = [t["_id"] async for t in expired_cursor]
+        if not expired_ids:
+            complete = True
+            break
+        await _delete_dependents([str(tid) for tid in expired_ids], deleted)
+        result = await testimonies_collection.delete_many({"_id": {"$in": expired_ids}})
+        deleted["testimonies"] += result.deleted_count
+
+    if complete:
+        complete = await _sweep_orphans(batch_size, deadline, deleted)
+
+    global last_sweep
+    last_sweep = {
+        "deleted": deleted,
+        "duration_ms": round((time.monotonic() - started) * 1000, 1),
+        "complete": complete,
+        "finished_at": datetime.utcnow()
+    }
+    return last_sweep
+
+async def _delete_dependents(testimony_ids: list, deleted: dict):
+    result = await testimony_reactions_collection.delete_many({"testimony_id": {"$in": testimony_ids}})
+    deleted["reactions"] += result.deleted_count
+    result = await notifications_collection.delete_many({"related_id": {"$in": testimony_ids}})
+    deleted["notifications"] += result.deleted_count
+
+async def _sweep_orphans(batch_size: int, deadline: float, deleted: dict) -> bool:
+    """Remove dependents of testimonies that no longer exist, checking testimony ids a batch at a time."""
+    referenced = testimony_reactions_collection.aggregate([{"$group": {"_id": "$testimony_id"}}])
+    batch = []
+    async for row in referenced:
+        batch.append(row["_id"])
+        if len(batch) >= batch_size:
+            await _delete_orphan_batch(batch, deleted)
+            batch = []
+            if time.monotonic() >= deadline:
+                return False
+    if batch:
+        await _delete_orphan_batch(batch, deleted)
+    return True
+
+async def _delete_orphan_batch(testimony_ids: list, deleted: dict):
+    object_ids = [ObjectId(t) for t in testimony_ids if ObjectId.is_valid(t)]
+    existing_cursor = testimonies_collection.find({"_id": {"$in": object_ids}}, {"_id": 1})
+    existing = {str(t["_id"]) async for t in existing_cursor}
+    orphaned = [t for t in testimony_ids if t not in existing]
+    if orphaned:
+        await _delete_dependents(orphaned, deleted)
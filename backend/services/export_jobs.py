@@ -0,0 +1,308 @@
+from database import export_jobs_collection
+from services.exporter import (
+    EXPORT_SOURCES, EXPORT_QUERY, export_cursor, export_record, export_filename,
+    encode_csv, encode_ndjson, compress_chunk, parquet_schema, parquet_table, load_pyarrow,
+    encode_watermark, WATERMARK_LAG
+)
+from bson import ObjectId
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from typing import Optional
+import asyncio
+import os
+import uuid
+
+# Artifacts live on local disk; every worker on the host must see the same directory
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+# Rows appended to the artifact (and checkpointed) at a time
+JOB_CHUNK_ROWS = 5000
+# A worker that stops checkpointing for this long loses the job to another worker
+JOB_LEASE = timedelta(minutes=2)
+ARTIFACT_RETENTION = timedelta(days=7)
+
+ACTIVE_STATUSES = ["queued", "running"]
+
+# Export tasks running in this worker, kept referenced until they finish
+running_jobs = set()
+
+class LeaseLost(Exception):
+    """Another worker took over the job; stop without touching its artifact."""
+
+def artifact_path(job: dict) -> str:
+    return os.path.join(EXPORT_DIR, f"{job['_id']}-{job['file_name']}")
+
+def part_path(job: dict, owner: str) -> str:
+    """
+    Where one run writes before the finished artifact is renamed into place.
+
+    Each run has its own file, so a worker that lost its lease can only ever
+    write to a file nobody else uses.
+    """
+    return os.path.join(EXPORT_DIR, f"{job['_id']}-{owner}.part")
+
+def _remove(path: Optional[str]):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+async def create_export_job(source: str, format: str, compression: Optional[str], created_by: str) -> dict:
+    collection, _ = EXPORT_SOURCES[source]
+    now = datetime.utcnow()
+    file_name, media_type = export_filename(source, format, compression)
+    job = {
+        "source": source,
+        "format": format,
+        "compression": compression,
+        "file_name": file_name,
+        "media_type": media_type,
+        "status": "queued",
+        "total_rows": await collection.count_documents(EXPORT_QUERY),
+        # Pass as since to /export/* to sync only what changed after this export started
+        "watermark": now - WATERMARK_LAG,
+        "rows_done": 0,
+        "bytes_written": 0,
+        "last_id": None,
+        "attempts": 0,
+        "owner": None,
+        "lease_until": now,
+        "created_by": created_by,
+        "created_at": now,
+        "updated_at": now
+    }
+    result = await export_jobs_collection.insert_one(job)
+    job["_id"] = result.inserted_id
+    start_export_job(result.inserted_id)
+    return job
+
+def start_export_job(job_id: ObjectId):
+    """Run the job in the background of this worker; the request that created it returns immediately."""
+    task = asyncio.create_task(run_export_job(job_id))
+    running_jobs.add(task)
+    task.add_done_callback(running_jobs.discard)
+
+async def claim_job(job_id: ObjectId, owner: str) -> Optional[dict]:
+    now = datetime.utcnow()
+    return await export_jobs_collection.find_one_and_update(
+        {"_id": job_id, "status": {"$in": ACTIVE_STATUSES}, "lease_until": {"$lte": now}},
+        {
+            "$set": {"status": "running", "owner": owner, "lease_until": now + JOB_LEASE,
+                     "run_started_at": now, "updated_at": now},
+            "$inc": {"attempts": 1}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+
+async def checkpoint(job: dict, owner: str, progress: dict):
+    """Record progress and extend the lease; raises LeaseLost if another worker owns the job now."""
+    now = datetime.utcnow()
+    result = await export_jobs_collection.update_one(
+        {"_id": job["_id"], "owner": owner},
+        {"$set": {**progress, "lease_until": now + JOB_LEASE, "updated_at": now}}
+    )
+    if not result.matched_count:
+        raise LeaseLost()
+
+async def run_export_job(job_id: ObjectId):
+    owner = uuid.uuid4().hex
+    job = None
+    try:
+        job = await claim_job(job_id, owner)
+        if not job:
+            return
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        if job["format"] == "parquet":
+            await _write_parquet(job, owner)
+        else:
+            await _write_appendable(job, owner)
+        # Only a complete artifact is ever moved to the download path
+        await asyncio.to_thread(os.replace, part_path(job, owner), artifact_path(job))
+        now = datetime.utcnow()
+        await checkpoint(job, owner, {"status": "completed", "finished_at": now,
+                                      "expires_at": now + ARTIFACT_RETENTION})
+    except LeaseLost:
+        print(f"Export job {job_id} was taken over by another worker")
+        _remove(part_path(job, owner))
+    except asyncio.CancelledError:
+        # Worker shutdown; the lease expires and resume_export_jobs picks the job up again
+        raise
+    except Exception as e:
+        print(f"Export job {job_id} failed: {e}")
+        if job:
+            _remove(part_path(job, owner))
+        now = datetime.utcnow()
+        await export_jobs_collection.update_one(
+            {"_id": job_id, "owner": owner},
+            {"$set": {"status": "failed", "error": str(e), "finished_at": now,
+                      "expires_at": now + ARTIFACT_RETENTION}}
+        )
+
+def _append(path: str, data: bytes):
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _resume_part(previous: Optional[str], path: str, size: int) -> bool:
+    """
+    Start path with the first size bytes of the previous run's part file.
+
+    Bytes past the checkpoint belong to a chunk whose checkpoint never landed
+    and are left behind. Returns False, leaving path empty, when the previous
+    file is gone or shorter than the checkpoint (e.g. the job moved to another
+    host, or the export directory was cleaned), so the caller starts over.
+    """
+    with open(path, "wb") as dst:
+        if size == 0:
+            return True
+        if not previous or not os.path.exists(previous) or os.path.getsize(previous) < size:
+            return False
+        with open(previous, "rb") as src:
+            remaining = size
+            while remaining:
+                data = src.read(min(remaining, 1024 * 1024))
+                dst.write(data)
+                remaining -= len(data)
+        dst.flush()
+        os.fsync(dst.fileno())
+    return True
+
+async def _write_appendable(job: dict, owner: str):
+    """
+    Append CSV/NDJSON chunks to this run's part file, checkpointing the last _id after each one.
+
+    Compressed chunks are independent gzip members / zstd frames, so resuming
+    carries over the checkpointed bytes and keeps appending.
+    """
+    collection, columns = EXPORT_SOURCES[job["source"]]
+    path = part_path(job, owner)
+    rows_done, bytes_written, last_id = job["rows_done"], job["bytes_written"], job["last_id"]
+    if not await asyncio.to_thread(_resume_part, job.get("part_file"), path, bytes_written):
+        print(f"Export job {job['_id']} has no usable partial artifact, starting over")
+        rows_done, bytes_written, last_id = 0, 0, None
+    # The restart point for ETA calculations
+    await checkpoint(job, owner, {"part_file": path, "rows_done": rows_done, "bytes_written": bytes_written,
+                                  "last_id": last_id, "run_rows_start": rows_done})
+    # Only once the checkpoint points at this run's file; the old one may still be written to, harmlessly
+    await asyncio.to_thread(_remove, job.get("part_file"))
+
+    query = dict(EXPORT_QUERY)
+    if last_id:
+        query["_id"] = {"$gt": last_id}
+
+    async def write_chunk(docs: list):
+        nonlocal rows_done, bytes_written, last_id
+        records = [export_record(doc, columns) for doc in docs]
+        if job["format"] == "csv":
+            data = encode_csv(records, columns, header=bytes_written == 0)
+        else:
+            data = encode_ndjson(records)
+        data = compress_chunk(data, job["compression"])
+        await asyncio.to_thread(_append, path, data)
+        rows_done += len(docs)
+        bytes_written += len(data)
+        if docs:
+            last_id = docs[-1]["_id"]
+        await checkpoint(job, owner, {"rows_done": rows_done, "bytes_written": bytes_written, "last_id": last_id})
+
+    docs = []
+    async for doc in export_cursor(collection, query, columns):
+        docs.append(doc)
+        if len(docs) >= JOB_CHUNK_ROWS:
+            await write_chunk(docs)
+            docs = []
+    if docs or bytes_written == 0:
+        await write_chunk(docs)
+
+async def _write_parquet(job: dict, owner: str):
+    """
+    Write the Parquet artifact one row group per chunk.
+
+    A Parquet file cannot be reopened for appending once its writer is gone,
+    so an interrupted Parquet job starts over instead of resuming mid-file.
+    """
+    _, pq = load_pyarrow()
+    collection, columns = EXPORT_SOURCES[job["source"]]
+    path = part_path(job, owner)
+    await checkpoint(job, owner, {"part_file": path, "rows_done": 0, "bytes_written": 0, "run_rows_start": 0})
+    await asyncio.to_thread(_remove, job.get("part_file"))
+    schema = parquet_schema(columns)
+    writer = await asyncio.to_thread(pq.ParquetWriter, path, schema, compression=job["compression"] or "snappy")
+    rows_done = 0
+
+    async def write_chunk(docs: list):
+        nonlocal rows_done
+        table = parquet_table([export_record(doc, columns) for doc in docs], schema)
+        await asyncio.to_thread(writer.write_table, table)
+        rows_done += len(docs)
+        await checkpoint(job, owner, {"rows_done": rows_done})
+
+    try:
+        docs = []
+        async for doc in export_cursor(collection, dict(EXPORT_QUERY), columns):
+            docs.append(doc)
+            if len(docs) >= JOB_CHUNK_ROWS:
+                await write_chunk(docs)
+                docs = []
+        if docs or rows_done == 0:
+            await write_chunk(docs)
+    finally:
+        await asyncio.to_thread(writer.close)
+    await checkpoint(job, owner, {"bytes_written": os.path.getsize(path)})
+
+def job_status(job: dict) -> dict:
+    """Progress summary with an ETA based on this run's throughput so far."""
+    eta_seconds = None
+    if job["status"] == "running" and job.get("run_started_at"):
+        elapsed = (datetime.utcnow() - job["run_started_at"]).total_seconds()
+        rows_this_run = job["rows_done"] - job.get("run_rows_start", 0)
+        if rows_this_run > 0 and elapsed > 0:
+            remaining = max(job["total_rows"] - job["rows_done"], 0)
+            eta_seconds = round(remaining / (rows_this_run / elapsed), 1)
+    total = job["total_rows"]
+    return {
+        "id": str(job["_id"]),
+        "source": job["source"],
+        "format": job["format"],
+        "compression": job["compression"],
+        "status": job["status"],
+        "rows_done": job["rows_done"],
+        "total_rows": total,
+        "progress": round(min(job["rows_done"] / total, 1.0), 4) if total else (1.0 if job["status"] == "completed" else 0.0),
+        "eta_seconds": eta_seconds,
+        "bytes_written": job["bytes_written"],
+        "error": job.get("error"),
+        "created_at": job["created_at"],
+        "finished_at": job.get("finished_at"),
+        "file_name": job["file_name"],
+        "watermark": encode_watermark(job["watermark"])
+    }
+
+async def get_export_job(job_id: str) -> Optional[dict]:
+    if not ObjectId.is_valid(job_id):
+        return None
+    return await export_jobs_collection.find_one({"_id": ObjectId(job_id)})
+
+async def resume_export_jobs() -> dict:
+    """
+    Scheduled maintenance: restart jobs whose worker stopped checkpointing,
+    and delete artifacts past their retention.
+    """
+    now = datetime.utcnow()
+    resumed = 0
+    stalled = export_jobs_collection.find(
+        {"status": {"$in": ACTIVE_STATUSES}, "lease_until": {"$lte": now}}, {"_id": 1}
+    )
+    async for job in stalled:
+        start_export_job(job["_id"])
+        resumed += 1
+
+    expired = 0
+    async for job in export_jobs_collection.find({"expires_at": {"$lte": now}}):
+        _remove(artifact_path(job))
+        _remove(job.get("part_file"))
+        await export_jobs_collection.delete_one({"_id": job["_id"]})
+        expired += 1
+    return {"resumed": resumed, "expired": expired}
@@ -0,0 +1,290 @@
+from fastapi import HTTPException
+from database import users_collection, prayers_collection, parishes_collection
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+import base64
+import csv
+import gzip
+import io
+import json
+import zlib
+
+# Column specs, encoders and compressors shared by the streaming export
+# endpoints and the background export jobs.
+
+# Documents pulled per cursor round trip, and rows written per chunk sent to the client
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FLUSH_ROWS = 500
+# Rows per Parquet row group; each group is written and sent as soon as it fills
+PARQUET_ROW_GROUP_SIZE = 10000
+
+# (column, type) pairs; types drive Parquet columns and value coercion
+USER_EXPORT_COLUMNS = [
+    ("id", "string"), ("full_name", "string"), ("email", "string"), ("mobile", "string"),
+    ("parish_id", "string"), ("is_active", "bool"), ("is_verified", "bool"),
+    ("created_at", "timestamp"), ("updated_at", "timestamp")
+]
+PRAYER_EXPORT_COLUMNS = [
+    ("id", "string"), ("user_id", "string"), ("parish_id", "string"), ("title", "string"),
+    ("content", "string"), ("is_anonymous", "bool"), ("created_at", "timestamp"), ("updated_at", "timestamp")
+]
+PARISH_EXPORT_COLUMNS = [
+    ("id", "string"), ("name", "string"), ("zone", "string"), ("location", "string"),
+    ("created_at", "timestamp"), ("updated_at", "timestamp")
+]
+
+# Exportable collections by name; passwords are never projected, so they cannot leak into a file
+EXPORT_SOURCES = {
+    "users": (users_collection, USER_EXPORT_COLUMNS),
+    "prayers": (prayers_collection, PRAYER_EXPORT_COLUMNS),
+    "parishes": (parishes_collection, PARISH_EXPORT_COLUMNS)
+}
+EXPORT_QUERY = {"is_deleted": {"$ne": True}}
+
+# Incremental exports stop this far behind "now", so writes still in flight
+# when the export starts land in the next window instead of being skipped
+WATERMARK_LAG = timedelta(seconds=5)
+# Extra column on incremental exports; tombstone rows carry only id, deleted and updated_at
+TOMBSTONE_COLUMN = ("deleted", "bool")
+# Incremental exports walk the (updated_at, _id) index, so they never wait on an in-memory sort
+CHANGE_SORT = [("updated_at", 1), ("_id", 1)]
+# Export columns read from a differently named document field
+SOURCE_FIELDS = {"id": "_id", "deleted": "is_deleted"}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet"
+}
+COMPRESSED_MEDIA_TYPES = {"gzip": ("application/gzip", ".gz"), "zstd": ("application/zstd", ".zst")}
+
+def export_filename(name: str, format: str, compression: Optional[str]) -> Tuple[str, str]:
+    """File name and media type for an export; Parquet compresses inside the file."""
+    if format == "parquet" or not compression:
+        return f"{name}.{format}", MEDIA_TYPES[format]
+    media_type, extension = COMPRESSED_MEDIA_TYPES[compression]
+    return f"{name}.{format}{extension}", media_type
+
+def export_projection(columns: List[Tuple[str, str]]) -> dict:
+    """Server-side projection of just the exported columns; "id" comes from _id."""
+    return {SOURCE_FIELDS.get(name, name): 1 for name, _ in columns if name != "id"}
+
+def coerce_value(value, column_type: str):
+    if value is None:
+        return None
+    if column_type == "string":
+        return value if isinstance(value, str) else str(value)
+    if column_type == "bool":
+        return bool(value)
+    if column_type == "timestamp":
+        return value if isinstance(value, datetime) else None
+    return value
+
+def export_record(doc: dict, columns: List[Tuple[str, str]]) -> dict:
+    if doc.get("is_deleted") and TOMBSTONE_COLUMN in columns:
+        tombstone = {name: None for name, _ in columns}
+        tombstone.update(id=str(doc["_id"]), deleted=True, updated_at=doc.get("updated_at"))
+        return tombstone
+    record = {
+        name: coerce_value(doc.get(SOURCE_FIELDS.get(name, name)), column_type)
+        for name, column_type in columns
+    }
+    if "deleted" in record:
+        record["deleted"] = False
+    return record
+
+def export_cursor(collection, query: dict, columns: List[Tuple[str, str]], sort=None):
+    cursor = collection.find(query, export_projection(columns)).sort(sort or [("_id", 1)])
+    return cursor.batch_size(EXPORT_BATCH_SIZE)
+
+def encode_watermark(moment: datetime) -> str:
+    return base64.urlsafe_b64encode(f"w1|{moment.isoformat()}".encode()).decode().rstrip("=")
+
+def decode_watermark(value: str) -> datetime:
+    """Accept an ISO 8601 timestamp or a watermark token from a previous export."""
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            raw = base64.urlsafe_b64decode((value + "=" * (-len(value) % 4)).encode()).decode()
+            version, iso = raw.split("|", 1)
+            if version != "w1":
+                raise ValueError(version)
+            moment = datetime.fromisoformat(iso)
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail="Invalid since watermark")
+    # Stored timestamps are naive UTC
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def change_window(since: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """(since, until) bounds of an incremental export; until doubles as the next watermark."""
+    if since is None:
+        return None, None
+    start = decode_watermark(since)
+    return start, max(start, datetime.utcnow() - WATERMARK_LAG)
+
+def export_query(since: Optional[datetime] = None, until: Optional[datetime] = None) -> dict:
+    """
+    Live documents for a full export, or everything changed in (since, until]
+    for an incremental one, soft-deleted documents included as tombstones.
+
+    Every write path (soft deletes included) stamps updated_at, so one range
+    on the (updated_at, _id) index finds all changes.
+    """
+    if since is None:
+        return dict(EXPORT_QUERY)
+    return {"updated_at": {"$gt": since, "$lte": until}}
+
+def export_columns(columns: List[Tuple[str, str]], incremental: bool) -> List[Tuple[str, str]]:
+    return columns + [TOMBSTONE_COLUMN] if incremental else columns
+
+def encode_csv(records: List[dict], columns: List[Tuple[str, str]], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    fieldnames = [name for name, _ in columns]
+    if header:
+        writer.writerow(fieldnames)
+    for record in records:
+        writer.writerow([record[name] for name in fieldnames])
+    return buffer.getvalue().encode()
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def encode_ndjson(records: List[dict]) -> bytes:
+    """One JSON object per line; datetimes as ISO 8601 strings."""
+    return "".join(json.dumps(record, default=_json_default) + "\n" for record in records).encode()
+
+async def stream_csv(cursor, columns: List[Tuple[str, str]]):
+    """
+    Yield CSV text as the cursor produces documents.
+
+    The header goes out before the first query round trip completes, and only
+    one chunk of rows is ever held in memory regardless of collection size.
+    """
+    yield encode_csv([], columns, header=True)
+    records = []
+    async for doc in cursor:
+        records.append(export_record(doc, columns))
+        if len(records) >= EXPORT_FLUSH_ROWS:
+            yield encode_csv(records, columns)
+            records = []
+    if records:
+        yield encode_csv(records, columns)
+
+async def stream_ndjson(cursor, columns: List[Tuple[str, str]]):
+    records = []
+    async for doc in cursor:
+        records.append(export_record(doc, columns))
+        if len(records) >= EXPORT_FLUSH_ROWS:
+            yield encode_ndjson(records)
+            records = []
+    if records:
+        yield encode_ndjson(records)
+
+def load_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+    return pyarrow, pyarrow.parquet
+
+def load_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise HTTPException(status_code=400, detail="zstd compression requires zstandard")
+    return zstandard
+
+def check_export_support(format: str, compression: Optional[str]):
+    """Fail with a 400 up front when an optional dependency for the export is missing."""
+    if format == "parquet":
+        load_pyarrow()
+    elif compression == "zstd":
+        load_zstandard()
+
+def parquet_schema(columns: List[Tuple[str, str]]):
+    pa, _ = load_pyarrow()
+    arrow_types = {"string": pa.string(), "bool": pa.bool_(), "timestamp": pa.timestamp("ms")}
+    return pa.schema([(name, arrow_types[column_type]) for name, column_type in columns])
+
+def parquet_table(records: List[dict], schema):
+    pa, _ = load_pyarrow()
+    return pa.Table.from_pylist(records, schema=schema)
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the caller, keeping absolute offsets for Parquet."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+async def stream_parquet(cursor, columns: List[Tuple[str, str]], compression: Optional[str]):
+    """
+    Yield a Parquet file written one row group at a time as the cursor streams.
+
+    Columns are typed (strings, booleans, millisecond timestamps), so pandas
+    reads them without any parsing.
+    """
+    _, pq = load_pyarrow()
+    schema = parquet_schema(columns)
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression or "snappy")
+
+    records = []
+    written = False
+    async for doc in cursor:
+        records.append(export_record(doc, columns))
+        if len(records) >= PARQUET_ROW_GROUP_SIZE:
+            writer.write_table(parquet_table(records, schema))
+            records, written = [], True
+            yield sink.drain()
+    if records or not written:
+        writer.write_table(parquet_table(records, schema))
+    writer.close()
+    yield sink.drain()
+
+async def compress_stream(chunks, compression: str):
+    if compression == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    else:
+        compressor = load_zstandard().ZstdCompressor(level=3).compressobj()
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def compress_chunk(data: bytes, compression: Optional[str]) -> bytes:
+    """
+    Compress one chunk as a self-contained gzip member or zstd frame.
+
+    Concatenated members/frames decompress as a single stream, which lets
+    export jobs append chunks to an artifact and resume after a crash.
+    """
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        return load_zstandard().ZstdCompressor(level=3).compress(data)
+    return data
@@ -0,0 +1,78 @@
+from database import testimonies_collection, testimony_reactions_collection
+from bson import ObjectId
+from pymongo import UpdateOne
+from typing import Dict, List
+
+REACTION_TYPES = ("praise", "amen", "thanks")
+
+def empty_reaction_counts() -> Dict[str, int]:
+    return {reaction: 0 for reaction in REACTION_TYPES}
+
+async def apply_reaction_delta(testimony_id: str, delta: Dict[str, int]):
+    """
+    Atomically adjust the denormalized reactions.<type> counters on a testimony.
+
+    Args:
+        testimony_id: String id of the testimony
+        delta: Mapping of reaction type to increment, e.g. {"praise": -1, "amen": 1}
+    """
+    inc = {f"reactions.{reaction}": amount for reaction, amount in delta.items() if amount}
+    if inc:
+        await testimonies_collection.update_one({"_id": ObjectId(testimony_id)}, {"$inc": inc})
+
+async def count_reactions(testimony_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    """Recount reactions for a batch of testimonies straight from the reactions collection."""
+    pipeline = [
+        {"$match": {"testimony_id": {"$in": testimony_ids}, "is_deleted": {"$ne": True}}},
+        {"$group": {
+            "_id": "$testimony_id",
+            **{
+                reaction: {"$sum": {"$cond": [{"$eq": ["$reaction", reaction]}, 1, 0]}}
+                for reaction in REACTION_TYPES
+            }
+        }}
+    ]
+    counts = {tid: empty_reaction_counts() for tid in testimony_ids}
+    async for row in testimony_reactions_collection.aggregate(pipeline):
+        counts[row["_id"]] = {reaction: row[reaction] for reaction in REACTION_TYPES}
+    return counts
+
+async def reconcile_reaction_counters(batch_size: int = 500) -> int:
+    """
+    Recompute every testimony's reaction counters and fix any drift.
+
+    Walks testimonies in batches so memory stays bounded, and only writes
+    documents whose stored counters disagree with the reactions collection.
+
+    Returns:
+        Number of testimonies whose counters were corrected
+    """
+    fixed = 0
+    cursor = testimonies_collection.find({}, {"reactions": 1}).batch_size(batch_size)
+    batch = []
+    async for t in cursor:
+        batch.append(t)
+        if len(batch) >= batch_size:
+            fixed += await _reconcile_batch(batch)
+            batch = []
+    if batch:
+        fixed += await _reconcile_batch(batch)
+    return fixed
+
+async def _reconcile_batch(testimonies: list) -> int:
+    actual = await count_reactions([str(t["_id"]) for t in testimonies])
+    updates = []
+    for t in testimonies:
+        stored = t.get("reactions") or {}
+        expected = actual[str(t["_id"])]
+        if any(stored.get(reaction) != expected[reaction] for reaction in REACTION_TYPES):
+            # Only overwrite the counters that were read: an $inc landing since then
+            # makes this a no-op, and the next run recounts that testimony
+            updates.append(UpdateOne(
+                {"_id": t["_id"], "reactions": t.get("reactions")},
+                {"$set": {"reactions": expected}}
+            ))
+    if not updates:
+        return 0
+    result = await testimonies_collection.bulk_write(updates, ordered=False)
+    return result.modified_count
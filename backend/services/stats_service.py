@@ -0,0 +1,133 @@
+from database import (
+    stats_collection, users_collection, prayers_collection, prayer_responses_collection, parishes_collection
+)
+from datetime import datetime, timedelta
+from typing import Dict
+from utils.cache import TTLCache
+from core.event_bridge import event_bridge
+
+# Single document holding the admin dashboard counters
+DASHBOARD_STATS_ID = "dashboard"
+DASHBOARD_COUNTERS = ("total_users", "active_users", "total_prayers", "recent_prayers", "total_parishes", "pending_prayers")
+RECENT_WINDOW = timedelta(days=30)
+LIVE = {"is_deleted": {"$ne": True}}
+
+# Members per parish for the admin parish list; one $group per TTL per worker
+PARISH_COUNTS_TTL_SECONDS = 60
+parish_member_cache = TTLCache(maxsize=1, ttl=PARISH_COUNTS_TTL_SECONDS)
+
+async def bump_stats(**deltas: int):
+    """
+    Apply counter deltas from a write path, e.g. bump_stats(total_users=1, active_users=1).
+
+    Counters can drift (TTL expiry, crashes between the write and the bump,
+    prayers aging out of the recent window); reconcile_dashboard_stats corrects them.
+    """
+    inc = {name: amount for name, amount in deltas.items() if amount}
+    if not inc:
+        return
+    try:
+        await stats_collection.update_one(
+            {"_id": DASHBOARD_STATS_ID},
+            {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+    except Exception as e:
+        # The write itself already succeeded; the reconciler will catch up
+        print(f"Failed to update dashboard stats: {e}")
+
+async def has_responses(prayer_id) -> bool:
+    return await prayer_responses_collection.count_documents({"prayer_id": prayer_id, **LIVE}, limit=1) > 0
+
+async def prayer_added():
+    await bump_stats(total_prayers=1, recent_prayers=1, pending_prayers=1)
+
+async def prayer_removed(prayer: dict):
+    """Counters for a prayer that was deleted; needs its _id and created_at."""
+    recent = prayer.get("created_at") and prayer["created_at"] >= datetime.utcnow() - RECENT_WINDOW
+    pending = not await has_responses(prayer["_id"])
+    await bump_stats(total_prayers=-1, recent_prayers=-1 if recent else 0, pending_prayers=-1 if pending else 0)
+
+async def response_added(prayer_id):
+    """A prayer stops being pending with its first response."""
+    count = await prayer_responses_collection.count_documents({"prayer_id": prayer_id, **LIVE}, limit=2)
+    if count == 1:
+        await bump_stats(pending_prayers=-1)
+
+async def get_parish_member_counts() -> Dict[str, int]:
+    """Live users per parish id string, from a single $group over users."""
+    counts = parish_member_cache.get("counts")
+    if counts is None:
+        pipeline = [
+            {"$match": {"parish_id": {"$ne": None}, **LIVE}},
+            # Parish ids are stored as ObjectIds or strings depending on the write path
+            {"$group": {"_id": {"$toString": "$parish_id"}, "count": {"$sum": 1}}}
+        ]
+        counts = {row["_id"]: row["count"] async for row in users_collection.aggregate(pipeline)}
+        parish_member_cache.set("counts", counts)
+    return counts
+
+class ParishMemberCountInvalidations:
+    """Receives invalidations published by other workers through the event bridge."""
+
+    def publish(self, event: dict, event_id: str = None):
+        parish_member_cache.clear()
+
+event_bridge.register("parish_member_counts", ParishMemberCountInvalidations())
+
+async def invalidate_parish_member_counts():
+    """Drop cached member counts on every worker; call after a user joins, leaves or is deleted from a parish."""
+    await event_bridge.publish("parish_member_counts", {"type": "parish_member_counts_changed"})
+
+async def get_dashboard_stats() -> dict:
+    stats = await stats_collection.find_one({"_id": DASHBOARD_STATS_ID})
+    if not stats or any(name not in stats for name in DASHBOARD_COUNTERS):
+        stats = await reconcile_dashboard_stats()
+    return {name: max(stats[name], 0) for name in DASHBOARD_COUNTERS}
+
+async def count_answered_prayers() -> int:
+    """Live prayers with at least one live response, counted from the responses side."""
+    pipeline = [
+        {"$match": LIVE},
+        {"$group": {"_id": "$prayer_id"}},
+        {"$lookup": {
+            "from": prayers_collection.name,
+            "localField": "_id",
+            "foreignField": "_id",
+            "pipeline": [{"$match": LIVE}, {"$project": {"_id": 1}}],
+            "as": "prayer"
+        }},
+        {"$match": {"prayer": {"$ne": []}}},
+        {"$count": "answered"}
+    ]
+    result = await prayer_responses_collection.aggregate(pipeline).to_list(1)
+    return result[0]["answered"] if result else 0
+
+async def reconcile_dashboard_stats() -> dict:
+    """
+    Recount every dashboard counter from the source collections and overwrite
+    the stats document. Scheduled job; the dashboard itself never runs these.
+
+    Returns:
+        The corrected counters and how far each one had drifted
+    """
+    previous = await stats_collection.find_one({"_id": DASHBOARD_STATS_ID}) or {}
+    total_prayers = await prayers_collection.count_documents(LIVE)
+    counters = {
+        "total_users": await users_collection.count_documents(LIVE),
+        "active_users": await users_collection.count_documents({"is_active": True, **LIVE}),
+        "total_prayers": total_prayers,
+        "recent_prayers": await prayers_collection.count_documents(
+            {"created_at": {"$gte": datetime.utcnow() - RECENT_WINDOW}, **LIVE}
+        ),
+        "total_parishes": await parishes_collection.count_documents(LIVE),
+        "pending_prayers": max(total_prayers - await count_answered_prayers(), 0)
+    }
+    now = datetime.utcnow()
+    await stats_collection.update_one(
+        {"_id": DASHBOARD_STATS_ID},
+        {"$set": {**counters, "updated_at": now, "reconciled_at": now}},
+        upsert=True
+    )
+    drift = {name: counters[name] - previous.get(name, 0) for name in DASHBOARD_COUNTERS if previous.get(name) != counters[name]}
+    return {**counters, "drift": drift}
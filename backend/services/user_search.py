@@ -0,0 +1,135 @@
+from database import users_collection
+from pymongo import UpdateOne
+from typing import List
+import re
+import unicodedata
+
+# Users are matched on normalized copies of their name and email, kept next to
+# the originals so anchored prefix regexes can walk an index:
+#   search_email:  lowercased email
+#   search_name:   lowercased, accent-free full name
+#   search_tokens: words of search_name (multikey index), so "smi" finds "John Smith"
+SEARCH_FIELDS = ("search_email", "search_name", "search_tokens")
+
+# Never returned to clients
+HIDDEN_USER_FIELDS = {"password": 0, **{field: 0 for field in SEARCH_FIELDS}}
+
+def normalize_search_text(text: str) -> str:
+    """Lowercase, strip accents and collapse whitespace."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.lower().split())
+
+def name_search_fields(full_name: str) -> dict:
+    name = normalize_search_text(full_name)
+    return {"search_name": name, "search_tokens": sorted(set(re.findall(r"\w+", name)))}
+
+def email_search_fields(email: str) -> dict:
+    return {"search_email": (email or "").strip().lower()}
+
+def search_fields(full_name: str, email: str) -> dict:
+    """Normalized search fields to store on a user document."""
+    return {**email_search_fields(email), **name_search_fields(full_name)}
+
+def _prefix(term: str) -> dict:
+    # Anchored and case-sensitive on pre-lowercased fields: an index range scan
+    return {"$regex": "^" + re.escape(term)}
+
+def _token_prefixes(terms: list) -> dict:
+    name_terms = [{"search_tokens": _prefix(term)} for term in terms]
+    return name_terms[0] if len(name_terms) == 1 else {"$and": name_terms}
+
+def search_filter(search: str) -> dict:
+    """
+    Query matching users whose email or full name starts with the search
+    text, or whose name has a word starting with each search term.
+    """
+    text = normalize_search_text(search)
+    terms = re.findall(r"\w+", text)
+    branches = []
+    if text and " " not in text:
+        branches.append({"search_email": _prefix(text)})
+    if len(terms) > 1:
+        branches.append({"search_name": _prefix(text)})
+    if terms:
+        branches.append(_token_prefixes(terms))
+    if not branches:
+        # Nothing searchable (e.g. only punctuation): match no one
+        return {"_id": None}
+    return {"$or": branches}
+
+def search_tiers(search: str) -> list:
+    """
+    (filter, index field, sorted) per relevance tier, best first: exact email,
+    exact name, email prefix, name prefix, then a word in the name starting
+    with each term. Each tier is a range scan of its field's index; prefix
+    tiers come back in index order, i.e. alphabetically, with no sort stage.
+    """
+    text = normalize_search_text(search)
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return []
+    tiers = []
+    if " " not in text:
+        tiers.append(({"search_email": text}, "search_email", False))
+    tiers.append(({"search_name": text}, "search_name", False))
+    if " " not in text:
+        tiers.append(({"search_email": _prefix(text)}, "search_email", True))
+    tiers.append(({"search_name": _prefix(text)}, "search_name", True))
+    tiers.append((_token_prefixes(terms), "search_tokens", False))
+    return tiers
+
+def tier_cursor(collection, query: dict, tier: tuple, seen: list, limit: int):
+    """
+    One tier's matches among users matching query, skipping users already found.
+
+    The hint pins the tier to its search index. Left to the planner, the
+    is_deleted or parish_id indexes can win for some filters and turn the
+    search into a scan of every live user or a whole parish.
+    """
+    tier_filter, field, ordered = tier
+    tier_query = {**query, **tier_filter}
+    if seen:
+        tier_query["_id"] = {"$nin": list(seen)}
+    cursor = collection.find(tier_query, HIDDEN_USER_FIELDS).hint([(field, 1)])
+    if ordered:
+        cursor = cursor.sort(field, 1)
+    return cursor.limit(limit)
+
+async def search_users(collection, query: dict, search: str, limit: int) -> List[dict]:
+    """
+    Best matches for search among users matching query, most relevant first.
+
+    Tiers are read in order and only until the page is full, so the best
+    matches are always returned however common a short prefix is, and no
+    tier scans past the first limit index entries that pass the filters.
+    """
+    users, seen = [], []
+    for tier in search_tiers(search):
+        remaining = limit - len(users)
+        if remaining <= 0:
+            break
+        async for user in tier_cursor(collection, query, tier, seen, remaining):
+            users.append(user)
+            seen.append(user["_id"])
+    return users
+
+async def backfill_user_search_fields(batch_size: int = 500) -> int:
+    """
+    Scheduled job: add search fields to users created by paths that do not set
+    them (seed and admin scripts, accounts older than the search index).
+
+    Returns:
+        Number of users updated
+    """
+    updated = 0
+    while True:
+        cursor = users_collection.find({"search_tokens": {"$exists": False}}, {"full_name": 1, "email": 1})
+        batch: List[dict] = await cursor.limit(batch_size).to_list(batch_size)
+        if not batch:
+            return updated
+        await users_collection.bulk_write([
+            UpdateOne({"_id": u["_id"]}, {"$set": search_fields(u.get("full_name"), u.get("email"))})
+            for u in batch
+        ], ordered=False)
+        updated += len(batch)
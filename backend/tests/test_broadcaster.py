@@ -0,0 +1,122 @@
+import asyncio
+from core.broadcaster import EventBroadcaster, TopicBroadcaster, RESYNC_EVENT, Subscription
+
+def drain(subscription: Subscription) -> list:
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+# Slow subscribers
+
+def test_overflow_coalesces_into_one_resync_marker():
+    broadcaster = EventBroadcaster(max_queue_size=3)
+    with broadcaster.subscribe() as slow:
+        for n in range(10):
+            broadcaster.publish({"n": n})
+        assert drain(slow) == [(None, RESYNC_EVENT)]
+        assert slow.resyncs == 1
+
+def test_lagging_subscriber_ignores_events_until_it_reads_the_resync():
+    broadcaster = EventBroadcaster(max_queue_size=2)
+    with broadcaster.subscribe() as slow:
+        for n in range(4):
+            broadcaster.publish({"n": n})
+        assert slow.lagging
+
+        async def read_resync():
+            return await slow.get(timeout=1)
+
+        assert asyncio.run(read_resync()) == (None, RESYNC_EVENT)
+        assert not slow.lagging
+        event_id = broadcaster.publish({"n": 4})
+        assert drain(slow) == [(event_id, {"n": 4})]
+        assert slow.resyncs == 1
+
+def test_slow_subscriber_does_not_affect_others():
+    broadcaster = EventBroadcaster(max_queue_size=2)
+    with broadcaster.subscribe() as slow, broadcaster.subscribe() as fast:
+        for n in range(3):
+            broadcaster.publish({"n": n})
+            drain(fast)
+        assert slow.lagging and not fast.lagging
+        assert broadcaster.stats() == {"subscribers": 2, "lagging": 1, "buffered_events": 3}
+    assert broadcaster.stats()["subscribers"] == 0
+
+# Last-Event-ID replay
+
+def test_replays_exactly_the_events_after_the_given_id_in_order():
+    broadcaster = EventBroadcaster(max_queue_size=5, history_size=500)
+    ids = [broadcaster.publish({"n": n}) for n in range(300)]
+    with broadcaster.subscribe(last_event_id=ids[99]) as subscription:
+        replayed = drain(subscription)
+    # Longer than max_queue_size: the whole gap is replayed, not turned into a resync
+    assert replayed == [(ids[n], {"n": n}) for n in range(100, 300)]
+
+def test_replay_then_live_events_keep_order():
+    broadcaster = EventBroadcaster(max_queue_size=5)
+    ids = [broadcaster.publish({"n": n}) for n in range(3)]
+    with broadcaster.subscribe(last_event_id=ids[0]) as subscription:
+        live_id = broadcaster.publish({"n": 3})
+        assert drain(subscription) == [(ids[1], {"n": 1}), (ids[2], {"n": 2}), (live_id, {"n": 3})]
+
+def test_up_to_date_client_gets_nothing_replayed():
+    broadcaster = EventBroadcaster()
+    last_id = broadcaster.publish({"n": 0})
+    with broadcaster.subscribe(last_event_id=last_id) as subscription:
+        assert drain(subscription) == []
+
+def test_evicted_id_gets_a_resync():
+    broadcaster = EventBroadcaster(history_size=10)
+    ids = [broadcaster.publish({"n": n}) for n in range(20)]
+    with broadcaster.subscribe(last_event_id=ids[5]) as subscription:
+        assert drain(subscription) == [(None, RESYNC_EVENT)]
+    with broadcaster.subscribe(last_event_id="not-an-event") as subscription:
+        assert drain(subscription) == [(None, RESYNC_EVENT)]
+
+# Per-topic broadcasters
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_topic_stays_replayable_inside_the_grace_window():
+    clock = FakeClock()
+    topics = TopicBroadcaster("prayer_id", idle_grace_seconds=120, clock=clock)
+    with topics.subscribe("p1"):
+        seen = topics.publish({"prayer_id": "p1", "n": 0})
+    # Nobody is watching, but the topic keeps recording for reconnecting clients
+    missed = topics.publish({"prayer_id": "p1", "n": 1})
+    clock.now = 119
+    with topics.subscribe("p1", last_event_id=seen) as subscription:
+        assert drain(subscription) == [(missed, {"prayer_id": "p1", "n": 1})]
+
+def test_topic_is_dropped_after_the_grace_window():
+    clock = FakeClock()
+    topics = TopicBroadcaster("prayer_id", idle_grace_seconds=120, clock=clock)
+    with topics.subscribe("p1"):
+        seen = topics.publish({"prayer_id": "p1", "n": 0})
+    clock.now = 120
+    assert topics.publish({"prayer_id": "p1", "n": 1}) is None
+    assert topics.stats() == {"topics": 0, "idle_topics": 0, "subscribers": 0}
+    with topics.subscribe("p1", last_event_id=seen) as subscription:
+        assert drain(subscription) == [(None, RESYNC_EVENT)]
+
+def test_resubscribing_cancels_the_grace_period():
+    clock = FakeClock()
+    topics = TopicBroadcaster("prayer_id", idle_grace_seconds=120, clock=clock)
+    with topics.subscribe("p1"):
+        pass
+    clock.now = 60
+    with topics.subscribe("p1"):
+        clock.now = 600
+        assert topics.publish({"prayer_id": "p1"}) is not None
+        assert topics.stats()["idle_topics"] == 0
+
+def test_events_for_unwatched_topics_are_discarded():
+    topics = TopicBroadcaster("prayer_id")
+    assert topics.publish({"prayer_id": "p2"}) is None
+    assert topics.stats()["topics"] == 0
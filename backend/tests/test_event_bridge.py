@@ -0,0 +1,144 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from core import event_bridge as event_bridge_module
+from core.broadcaster import EventBroadcaster
+from core.event_bridge import CappedCollectionEventLog, EventBridge, InMemoryEventLog
+
+class FakeCursor:
+    """A tailable cursor over a snapshot of the collection that dies once drained."""
+
+    def __init__(self, docs):
+        self.docs = list(docs)
+        self.alive = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            self.alive = False
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+class FakeCappedCollection:
+    """Insertion-ordered documents with the few calls CappedCollectionEventLog makes."""
+
+    name = "stream_events"
+
+    def __init__(self, max_docs: int = 100):
+        self.docs = []
+        self.max_docs = max_docs
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+        del self.docs[:-self.max_docs]
+
+    async def find_one(self, query=None, sort=None):
+        if sort:
+            return self.docs[-1] if self.docs else None
+        return next((d for d in self.docs if d["_id"] == query["_id"]), None)
+
+    def find(self, query, cursor_type=None, sort=None):
+        assert query == {}, "the log must be walked in insertion order, not filtered by _id"
+        return FakeCursor(self.docs)
+
+def collect(bridge: EventBridge, channel: str) -> EventBroadcaster:
+    broadcaster = EventBroadcaster()
+    bridge.register(channel, broadcaster)
+    return broadcaster
+
+async def next_event(subscription, timeout: float = 1):
+    return await subscription.get(timeout=timeout)
+
+def test_events_reach_other_workers_with_the_same_id():
+    async def scenario():
+        log = InMemoryEventLog()
+        worker_a, worker_b = EventBridge(log, "a"), EventBridge(log, "b")
+        local, remote = collect(worker_a, "testimonies"), collect(worker_b, "testimonies")
+        tasks = [asyncio.create_task(w.run()) for w in (worker_a, worker_b)]
+        await asyncio.sleep(0)
+        with local.subscribe() as on_a, remote.subscribe() as on_b:
+            event_id = await worker_a.publish("testimonies", {"type": "testimony_created"})
+            assert await next_event(on_a) == (event_id, {"type": "testimony_created"})
+            assert await next_event(on_b) == (event_id, {"type": "testimony_created"})
+            # The publishing worker does not get its own event a second time from the log
+            with pytest.raises(asyncio.TimeoutError):
+                await next_event(on_a, timeout=0.05)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+def test_events_for_unregistered_channels_are_ignored():
+    bridge = EventBridge(InMemoryEventLog(), "a")
+    bridge.dispatch({"_id": ObjectId(), "channel": "unknown", "event": {}, "origin": "b"})
+
+def test_publish_survives_a_failing_log():
+    class BrokenLog(InMemoryEventLog):
+        async def append(self, doc):
+            raise ConnectionError("log unavailable")
+
+    async def scenario():
+        bridge = EventBridge(BrokenLog(), "a")
+        local = collect(bridge, "prayer_threads")
+        with local.subscribe() as subscription:
+            event_id = await bridge.publish("prayer_threads", {"type": "prayer_response_added"})
+            assert await next_event(subscription) == (event_id, {"type": "prayer_response_added"})
+
+    asyncio.run(scenario())
+
+def test_capped_log_resumes_after_events_with_smaller_ids(monkeypatch):
+    monkeypatch.setattr(event_bridge_module, "RECONNECT_DELAY_SECONDS", 0)
+
+    async def scenario():
+        collection = FakeCappedCollection()
+        log = CappedCollectionEventLog(collection)
+        first_tail = log.tail()
+        reader = asyncio.create_task(anext(first_tail))
+        await asyncio.sleep(0.01)
+        # Another worker's clock is behind: its later event has a smaller id
+        newer_id, older_id = sorted([ObjectId(), ObjectId()], reverse=True)
+        await collection.insert_one({"_id": newer_id, "n": 1})
+        assert (await asyncio.wait_for(reader, 1))["n"] == 1
+        await first_tail.aclose()
+
+        await collection.insert_one({"_id": older_id, "n": 2})
+        resumed = log.tail()
+        assert (await asyncio.wait_for(anext(resumed), 1))["n"] == 2
+        await resumed.aclose()
+
+    asyncio.run(scenario())
+
+def test_capped_log_starts_after_existing_history(monkeypatch):
+    monkeypatch.setattr(event_bridge_module, "RECONNECT_DELAY_SECONDS", 0)
+
+    async def scenario():
+        collection = FakeCappedCollection()
+        await collection.insert_one({"_id": ObjectId(), "n": 1})
+        log = CappedCollectionEventLog(collection)
+        tail = log.tail()
+        reader = asyncio.create_task(anext(tail))
+        await asyncio.sleep(0.01)
+        await collection.insert_one({"_id": ObjectId(), "n": 2})
+        assert (await asyncio.wait_for(reader, 1))["n"] == 2
+        await tail.aclose()
+
+    asyncio.run(scenario())
+
+def test_capped_log_resumes_from_start_when_last_event_was_overwritten(monkeypatch):
+    monkeypatch.setattr(event_bridge_module, "RECONNECT_DELAY_SECONDS", 0)
+
+    async def scenario():
+        collection = FakeCappedCollection(max_docs=2)
+        log = CappedCollectionEventLog(collection)
+        await collection.insert_one({"_id": ObjectId(), "n": 1})
+        log.last_id = collection.docs[0]["_id"]
+        for n in (2, 3, 4):
+            await collection.insert_one({"_id": ObjectId(), "n": n})
+        tail = log.tail()
+        assert [(await anext(tail))["n"] for _ in range(2)] == [3, 4]
+        await tail.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import jwt
+from core.rate_limiter import (
+    InMemoryBucketStore, RateLimitMiddleware, RateLimitPolicy, RATE_LIMIT_POLICIES, MAX_BUFFERED_BODY,
+    client_ip, parse_trusted_proxies
+)
+from utils.security import SECRET_KEY, ALGORITHM
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def policy(key: str = "ip", capacity: int = 2, per_seconds: float = 60) -> RateLimitPolicy:
+    return RateLimitPolicy("test", frozenset({"POST"}), r"^/limited$", key, capacity, per_seconds)
+
+def scope(path: str = "/limited", method: str = "POST", client: str = "203.0.113.5", headers=()):
+    return {"type": "http", "method": method, "path": path, "client": (client, 50000), "headers": list(headers)}
+
+def call(middleware, request_scope, body: bytes = b"") -> dict:
+    """Send one request through the middleware; returns the status and what the app saw."""
+    seen = {}
+
+    async def app(scope, receive, send):
+        message = await receive()
+        seen["body"] = message.get("body", b"")
+        seen["status"] = 200
+
+    async def scenario():
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        middleware.app = app
+        await middleware(request_scope, receive, send)
+        if sent:
+            seen["status"] = sent[0]["status"]
+            seen["headers"] = dict(sent[0]["headers"])
+        return seen
+
+    return asyncio.run(scenario())
+
+# Token bucket
+
+def test_bucket_allows_capacity_then_refills_over_time():
+    clock = FakeClock()
+    store = InMemoryBucketStore(clock=clock)
+
+    def consume():
+        return asyncio.run(store.consume("k", 3, 1 / 20))[0]
+
+    assert [consume() for _ in range(4)] == [True, True, True, False]
+    clock.now += 19
+    assert consume() is False
+    clock.now += 1
+    assert consume() is True
+    assert consume() is False
+
+def test_bucket_never_exceeds_capacity_after_long_idle():
+    clock = FakeClock()
+    store = InMemoryBucketStore(clock=clock)
+    asyncio.run(store.consume("k", 2, 1))
+    clock.now += 3600
+    assert [asyncio.run(store.consume("k", 2, 1))[0] for _ in range(3)] == [True, True, False]
+
+def test_bucket_store_evicts_least_recently_used_keys():
+    store = InMemoryBucketStore(maxsize=2, clock=FakeClock())
+    for key in ("a", "b", "a", "c"):
+        asyncio.run(store.consume(key, 5, 1))
+    assert list(store.buckets) == ["a", "c"]
+
+# Middleware
+
+def limited(policies, **options):
+    return RateLimitMiddleware(None, policies=policies, store=InMemoryBucketStore(clock=FakeClock()), **options)
+
+def test_rejects_with_429_and_retry_after():
+    middleware = limited([policy(capacity=2, per_seconds=60)])
+    responses = [call(middleware, scope()) for _ in range(3)]
+    assert [r["status"] for r in responses] == [200, 200, 429]
+    assert responses[-1]["headers"][b"retry-after"] == b"30"
+
+def test_unmatched_routes_are_not_limited():
+    middleware = limited([policy(capacity=1)])
+    assert [call(middleware, scope(path="/other"))["status"] for _ in range(3)] == [200, 200, 200]
+    assert [call(middleware, scope(method="GET"))["status"] for _ in range(3)] == [200, 200, 200]
+
+def test_email_key_buckets_per_account_and_replays_body():
+    middleware = limited([policy(key="email", capacity=1)])
+    body = json.dumps({"email": " Someone@Example.com ", "password": "x"}).encode()
+    first = call(middleware, scope(), body)
+    assert first["status"] == 200
+    assert first["body"] == body
+    other_case = json.dumps({"email": "someone@example.com"}).encode()
+    assert call(middleware, scope(client="198.51.100.1"), other_case)["status"] == 429
+    assert call(middleware, scope(), json.dumps({"email": "other@example.com"}).encode())["status"] == 200
+
+def test_oversized_body_is_refused():
+    middleware = limited([policy(key="email")])
+    assert call(middleware, scope(), b"x" * (MAX_BUFFERED_BODY + 1))["status"] == 413
+
+def test_user_key_uses_token_subject_and_falls_back_to_ip():
+    middleware = limited([policy(key="user", capacity=1)])
+    token = jwt.encode({"sub": "user-1"}, SECRET_KEY, algorithm=ALGORITHM)
+    auth = [(b"authorization", f"Bearer {token}".encode())]
+    assert call(middleware, scope(headers=auth))["status"] == 200
+    assert call(middleware, scope(headers=auth, client="198.51.100.1"))["status"] == 429
+    # Anonymous callers share their IP's bucket instead
+    assert call(middleware, scope())["status"] == 200
+    assert call(middleware, scope())["status"] == 429
+
+def test_store_failure_lets_requests_through():
+    class BrokenStore:
+        async def consume(self, *args):
+            raise ConnectionError("store unavailable")
+
+    middleware = RateLimitMiddleware(None, policies=[policy(capacity=1)], store=BrokenStore())
+    assert [call(middleware, scope())["status"] for _ in range(3)] == [200, 200, 200]
+
+def test_admin_limit_only_covers_user_management():
+    admin = next(p for p in RATE_LIMIT_POLICIES if p.name == "admin_write_user")
+    assert admin.matches("PUT", "/admin/users/abc")
+    assert admin.matches("DELETE", "/admin/users/abc/roles/def")
+    assert not admin.matches("GET", "/admin/users")
+    assert not admin.matches("DELETE", "/admin/prayers/abc")
+    assert not admin.matches("PUT", "/admin/roles/abc")
+    assert not admin.matches("PUT", "/admin/usersettings")
+
+# Client address
+
+PROXIES = parse_trusted_proxies("127.0.0.1, 10.0.0.0/8")
+
+def forwarded(value: str):
+    return [(b"x-forwarded-for", value.encode())]
+
+def test_forwarded_for_is_ignored_from_untrusted_clients():
+    assert client_ip(scope(client="203.0.113.5", headers=forwarded("198.51.100.1")), PROXIES) == "203.0.113.5"
+    assert client_ip(scope(headers=forwarded("198.51.100.1")), []) == "203.0.113.5"
+
+def test_forwarded_for_uses_rightmost_untrusted_hop():
+    # The client prepended a spoofed hop; the proxies appended the real address
+    headers = forwarded("1.2.3.4, 198.51.100.7, 10.0.0.2")
+    assert client_ip(scope(client="10.0.0.1", headers=headers), PROXIES) == "198.51.100.7"
+
+def test_forwarded_for_from_only_trusted_hops_falls_back_to_peer():
+    assert client_ip(scope(client="127.0.0.1", headers=forwarded("10.0.0.3")), PROXIES) == "127.0.0.1"
+    assert client_ip(scope(client="127.0.0.1"), PROXIES) == "127.0.0.1"
+
+def test_spoofed_forwarded_for_cannot_reset_an_ip_bucket():
+    middleware = limited([policy(capacity=2)], trusted_proxies=PROXIES)
+    statuses = [
+        call(middleware, scope(headers=forwarded(f"198.51.100.{n}")))["status"]
+        for n in range(4)
+    ]
+    assert statuses == [200, 200, 429, 429]
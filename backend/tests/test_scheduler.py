@@ -0,0 +1,160 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from core.scheduler import CronSchedule, IntervalSchedule, InMemoryJobStore, Scheduler, LEASE_GRACE
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+    def advance(self, **delta):
+        self.now += timedelta(**delta)
+
+def make_scheduler(store, clock, owner):
+    return Scheduler(store, clock=clock, owner=owner)
+
+def counting_job(calls: list, name: str = "job"):
+    async def job():
+        calls.append(name)
+        return len(calls)
+    return job
+
+# CronSchedule.next_after
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    ("*/15 * * * *", datetime(2026, 1, 1, 10, 7, 30), datetime(2026, 1, 1, 10, 15)),
+    ("0 3 * * *", datetime(2026, 1, 1, 3, 0), datetime(2026, 1, 2, 3, 0)),
+    ("30 23 31 12 *", datetime(2026, 12, 31, 23, 31), datetime(2027, 12, 31, 23, 30)),
+    # 2026-01-04 is a Sunday
+    ("0 9 * * 0", datetime(2026, 1, 1, 12, 0), datetime(2026, 1, 4, 9, 0)),
+    ("0 9 * * 7", datetime(2026, 1, 1, 12, 0), datetime(2026, 1, 4, 9, 0)),
+    ("0 8-10/2 * * 1-5", datetime(2026, 1, 2, 10, 0), datetime(2026, 1, 5, 8, 0)),
+    # Both day fields restricted: either one matching is enough
+    ("0 0 15 * 1", datetime(2026, 1, 1, 0, 0), datetime(2026, 1, 5, 0, 0)),
+    ("0 0 29 2 *", datetime(2026, 3, 1), datetime(2028, 2, 29)),
+])
+def test_cron_next_after(expression, moment, expected):
+    assert CronSchedule(expression).next_after(moment) == expected
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* 24 * * *", "5-1 * * * *", "*/0 * * * *"])
+def test_cron_rejects_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+def test_cron_that_never_fires_raises():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 31 2 *").next_after(datetime(2026, 1, 1))
+
+# Scheduler with a fake clock
+
+def test_interval_job_runs_on_startup_then_after_interval():
+    clock = FakeClock(datetime(2026, 1, 1, 12, 0))
+    store = InMemoryJobStore()
+    scheduler = make_scheduler(store, clock, "a")
+    calls = []
+    scheduler.add_job("job", counting_job(calls), IntervalSchedule(minutes=5))
+
+    runs = asyncio.run(scheduler.run_pending())
+    assert [r["status"] for r in runs] == ["success"]
+    assert runs[0]["next_run_at"] == datetime(2026, 1, 1, 12, 5)
+
+    clock.advance(minutes=4)
+    assert asyncio.run(scheduler.run_pending()) == []
+    clock.advance(minutes=1)
+    assert len(asyncio.run(scheduler.run_pending())) == 1
+    assert calls == ["job", "job"]
+
+def test_only_one_worker_runs_each_occurrence():
+    clock = FakeClock(datetime(2026, 1, 1, 12, 0))
+    store = InMemoryJobStore()
+    calls = []
+    workers = [make_scheduler(store, clock, owner) for owner in ("a", "b", "c")]
+    for worker in workers:
+        worker.add_job("job", counting_job(calls), IntervalSchedule(minutes=5))
+
+    async def tick_all():
+        return [run for worker in workers for run in await worker.run_pending()]
+
+    for _ in range(3):
+        assert len(asyncio.run(tick_all())) == 1
+        clock.advance(minutes=5)
+    assert len(calls) == 3
+    assert len(store.runs) == 3
+
+def test_missed_runs_are_not_replayed():
+    clock = FakeClock(datetime(2026, 1, 1, 12, 0))
+    store = InMemoryJobStore()
+    scheduler = make_scheduler(store, clock, "a")
+    calls = []
+    scheduler.add_job("job", counting_job(calls), IntervalSchedule(minutes=5))
+    asyncio.run(scheduler.run_pending())
+
+    # Down for an hour: twelve occurrences missed, but the job catches up with a single run
+    clock.advance(hours=1)
+    runs = asyncio.run(scheduler.run_pending())
+    assert len(runs) == 1
+    assert runs[0]["next_run_at"] == clock.now + timedelta(minutes=5)
+    assert asyncio.run(scheduler.run_pending()) == []
+    assert len(calls) == 2
+
+def test_crashed_lease_holder_is_taken_over_after_budget_and_grace():
+    clock = FakeClock(datetime(2026, 1, 1, 12, 0))
+    store = InMemoryJobStore()
+    asyncio.run(store.register("job", clock.now))
+    # Worker "a" took the lease and died without releasing it
+    lease_until = clock.now + timedelta(seconds=60) + LEASE_GRACE
+    acquired, _ = asyncio.run(store.acquire("job", "a", clock.now, lease_until))
+    assert acquired
+
+    survivor = make_scheduler(store, clock, "b")
+    calls = []
+    survivor.add_job("job", counting_job(calls), IntervalSchedule(minutes=5), time_budget_seconds=60)
+    assert asyncio.run(survivor.run_pending()) == []
+
+    clock.advance(seconds=60)
+    assert asyncio.run(survivor.run_pending()) == []
+    clock.now = lease_until
+    runs = asyncio.run(survivor.run_pending())
+    assert [r["owner"] for r in runs] == ["b"]
+
+    # The old holder coming back late cannot overwrite the new schedule
+    next_run_at = store.leases["job"]["next_run_at"]
+    asyncio.run(store.release("job", "a", clock.now, clock.now))
+    assert store.leases["job"]["next_run_at"] == next_run_at
+    assert store.leases["job"]["owner"] == "b"
+
+def test_failing_and_slow_jobs_are_recorded_and_rescheduled():
+    clock = FakeClock(datetime(2026, 1, 1, 12, 0))
+    store = InMemoryJobStore()
+    scheduler = make_scheduler(store, clock, "a")
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    scheduler.add_job("broken", broken, IntervalSchedule(minutes=1))
+    scheduler.add_job("slow", slow, IntervalSchedule(minutes=1), time_budget_seconds=0.01)
+    runs = {r["job"]: r for r in asyncio.run(scheduler.run_pending())}
+    assert runs["broken"]["status"] == "failed"
+    assert runs["broken"]["error"] == "boom"
+    assert runs["slow"]["status"] == "timeout"
+
+    clock.advance(minutes=1)
+    assert len(asyncio.run(scheduler.run_pending())) == 2
+
+def test_cron_job_first_runs_at_next_match():
+    clock = FakeClock(datetime(2026, 1, 1, 2, 30))
+    store = InMemoryJobStore()
+    scheduler = make_scheduler(store, clock, "a")
+    calls = []
+    scheduler.add_job("nightly", counting_job(calls), CronSchedule("0 3 * * *"))
+
+    assert asyncio.run(scheduler.run_pending()) == []
+    clock.now = datetime(2026, 1, 1, 3, 0)
+    runs = asyncio.run(scheduler.run_pending())
+    assert runs[0]["next_run_at"] == datetime(2026, 1, 2, 3, 0)
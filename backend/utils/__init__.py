@@ -1 +1 @@
-from .security import create_jwt, verify_password, hash_password, SECRET_KEY, ALGORITHM
\ No newline at end of file
+from .security import create_jwt, verify_password, hash_password, password_hasher, SECRET_KEY, ALGORITHM
\ No newline at end of file
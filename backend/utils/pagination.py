@@ -0,0 +1,80 @@
+from fastapi import HTTPException
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+from typing import Optional
+from utils.cache import TTLCache
+import base64
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Feeds are ordered newest first; _id breaks ties between equal timestamps
+KEYSET_SORT = [("created_at", -1), ("_id", -1)]
+
+def encode_cursor(created_at: datetime, doc_id) -> str:
+    """Encode the (created_at, _id) position of the last item on a page as an opaque token."""
+    raw = f"{created_at.isoformat()}|{doc_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        created_at, doc_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), ObjectId(doc_id)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_filter(after: Optional[str]) -> dict:
+    """Query fragment selecting documents strictly after the cursor in KEYSET_SORT order."""
+    if not after:
+        return {}
+    created_at, doc_id = decode_cursor(after)
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": doc_id}}
+        ]
+    }
+
+def next_cursor(items: list, limit: int) -> Optional[str]:
+    """
+    Trim a page fetched with limit + 1 rows and return the cursor for the next page.
+
+    Items must already carry "id" and "created_at"; returns None on the last page.
+    """
+    if len(items) <= limit:
+        return None
+    del items[limit:]
+    last = items[-1]
+    return encode_cursor(last["created_at"], last["id"])
+
+# Listing totals change slowly relative to how often admins page through them
+TOTALS_TTL_SECONDS = 30
+total_cache = TTLCache(maxsize=1000, ttl=TOTALS_TTL_SECONDS)
+LIVE_QUERY = {"is_deleted": {"$ne": True}}
+
+async def cached_total(collection, query: dict, shape: tuple = ()) -> int:
+    """
+    Total matching documents for a paginated listing, cached briefly per query shape.
+
+    Args:
+        collection: Collection being listed
+        query: Filter of the listing, without any cursor condition
+        shape: Hashable summary of the caller's filters (search term, parish, ...);
+            an empty shape means the listing is unfiltered
+
+    Unfiltered listings skip the scan entirely: collection metadata gives the
+    document count and the is_deleted index gives the soft-deleted ones.
+    """
+    key = (collection.name, shape)
+    total = total_cache.get(key)
+    if total is None:
+        if not shape and query == LIVE_QUERY:
+            total = await collection.estimated_document_count()
+            total -= await collection.count_documents({"is_deleted": True})
+            total = max(total, 0)
+        else:
+            total = await collection.count_documents(query)
+        total_cache.set(key, total)
+    return total
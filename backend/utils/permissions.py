@@ -1,18 +1,57 @@
 from fastapi import HTTPException, status
 from bson import ObjectId
 from database import db
+from utils.cache import TTLCache
+from core.event_bridge import event_bridge
+
+# Effective permissions per (user_id, role_version); bumping the version orphans every entry
+permission_cache = TTLCache(maxsize=10000, ttl=300)
+role_version = 0
+
+class RoleVersionListener:
+    """Bumps this worker's role version when any worker changes roles or assignments."""
+
+    def publish(self, event: dict, event_id: str = None):
+        global role_version
+        role_version += 1
+
+event_bridge.register("role_changes", RoleVersionListener())
+
+async def bump_role_version():
+    """Invalidate cached permissions on every worker; call after any role or user-role write."""
+    await event_bridge.publish("role_changes", {"type": "role_version_bumped"})
+
+async def get_user_permissions(user_id: str) -> frozenset:
+    """Resolve a user's effective permissions with a single aggregation, cached per role version."""
+    key = (str(user_id), role_version)
+    permissions = permission_cache.get(key)
+    if permissions is not None:
+        return permissions
+
+    pipeline = [
+        {"$match": {"user_id": ObjectId(user_id)}},
+        {"$lookup": {
+            "from": "roles",
+            "localField": "role_id",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"_id": 0, "permissions": 1}}],
+            "as": "role"
+        }},
+        {"$unwind": "$role"},
+        {"$unwind": "$role.permissions"},
+        {"$group": {"_id": None, "permissions": {"$addToSet": "$role.permissions"}}}
+    ]
+    rows = await db.user_roles.aggregate(pipeline).to_list(length=1)
+    permissions = frozenset(rows[0]["permissions"]) if rows else frozenset()
+    permission_cache.set(key, permissions)
+    return permissions
 
 async def user_has_permission(user_id: str, permission: str) -> bool:
-    roles_cursor = db.user_roles.find({"user_id": ObjectId(user_id)})
-    async for ur in roles_cursor:
-        role = await db.roles.find_one({"_id": ur["role_id"]})
-        if role and permission in role.get("permissions", []):
-            return True
-    return False
+    return permission in await get_user_permissions(user_id)
 
 async def require_permission(user_id: str, permission: str):
     if not await user_has_permission(user_id, permission):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You do not have permission to perform this action"
-        )
\ No newline at end of file
+        )
@@ -1,5 +1,10 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+import asyncio
 import jwt
+import os
+import time
 from datetime import datetime, timedelta
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -10,6 +15,70 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+class PasswordHasher:
+    """
+    Runs bcrypt on a bounded thread pool so request handlers never block the event loop.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism.
+    At most max_workers hashes run at once; once max_pending calls are waiting,
+    further calls are rejected with 503 rather than queueing without bound.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 64):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self.slots = asyncio.Semaphore(max_workers)
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def run(self, fn, *args):
+        if self.waiting >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server busy, please try again")
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - queued_at
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": self.total_wait_seconds * 1000 / self.completed if self.completed else 0.0,
+            "max_wait_ms": self.max_wait_seconds * 1000
+        }
+
+password_hasher = PasswordHasher(
+    max_workers=int(os.getenv("BCRYPT_WORKERS", min(4, os.cpu_count() or 1))),
+    max_pending=int(os.getenv("BCRYPT_MAX_PENDING", 64))
+)
+
 # ------------------------
 # JWT Utility
 # ------------------------
@@ -1,26 +1,21 @@
 import { useEffect, useState, useCallback } from "react";
-import { getPrayerById, respondToPrayer } from "../services/prayerService";
+import { getPrayerById, respondToPrayer, openPrayerStream } from "../services/prayerService";
 
 export default function PrayerDetails({ prayerId }) {
   const [prayer, setPrayer] = useState(null);
   const [responseText, setResponseText] = useState("");
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
-  const [lastFetchedAt, setLastFetchedAt] = useState(null);
   const [isVisible, setIsVisible] = useState(!document.hidden);
 
   // Function to fetch prayer details
   const fetchPrayer = useCallback(async () => {
-    if (!isVisible) return; // Skip if not visible
-
     try {
       setError(null);
-      const params = lastFetchedAt ? `?since=${lastFetchedAt}` : '';
-      const data = await getPrayerById(prayerId, params);
+      const data = await getPrayerById(prayerId);
       if (data.success) {
         setPrayer(data.prayer);
         setLoading(false);
-        setLastFetchedAt(new Date().toISOString());
       } else {
         setError("Failed to load prayer details.");
       }
@@ -28,7 +23,15 @@ export default function PrayerDetails({ prayerId }) {
       setError("Failed to load prayer details.");
       console.error(err);
     }
-  }, [prayerId, lastFetchedAt, isVisible]);
+  }, [prayerId]);
+
+  // Append a pushed response unless we already have it (e.g. our own submission)
+  const addResponse = useCallback((response) => {
+    setPrayer((prev) => {
+      if (!prev || prev.responses.some((r) => r.id && r.id === response.id)) return prev;
+      return { ...prev, responses: [...prev.responses, response] };
+    });
+  }, []);
 
   // Handle visibility change
   useEffect(() => {
@@ -40,15 +43,23 @@ export default function PrayerDetails({ prayerId }) {
     return () => document.removeEventListener('visibilitychange', handleVisibilityChange);
   }, []);
 
-  // Auto-refresh every 5 seconds when visible
+  // Load once, then receive new responses over the live stream while visible
   useEffect(() => {
     if (!isVisible) return;
 
-    fetchPrayer(); // initial fetch
-    const interval = setInterval(fetchPrayer, 5000); // every 5 sec
+    fetchPrayer();
+    const stream = openPrayerStream(prayerId);
+    stream.onmessage = (e) => {
+      const event = JSON.parse(e.data);
+      if (event.type === "prayer_response_added") {
+        addResponse(event.response);
+      } else if (event.type === "resync") {
+        fetchPrayer(); // missed too much while disconnected
+      }
+    };
 
-    return () => clearInterval(interval); // cleanup on unmount
-  }, [prayerId, fetchPrayer, isVisible]);
+    return () => stream.close(); // cleanup on unmount or when hidden
+  }, [prayerId, fetchPrayer, addResponse, isVisible]);
 
   const handleResponseSubmit = async () => {
     if (!responseText.trim()) return;
@@ -60,10 +71,7 @@ export default function PrayerDetails({ prayerId }) {
         responseText,
       });
 
-      setPrayer((prev) => ({
-        ...prev,
-        responses: [...prev.responses, newResponse.response],
-      }));
+      addResponse(newResponse.response);
 
       setResponseText("");
     } catch (err) {
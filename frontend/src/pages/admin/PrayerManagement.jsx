@@ -9,6 +9,8 @@ const PrayerManagement = () => {
   const [error, setError] = useState(null);
   const [currentPage, setCurrentPage] = useState(1);
   const [totalPages, setTotalPages] = useState(1);
+  // cursors[n] is the `after` token that loads page n + 1
+  const [cursors, setCursors] = useState([null]);
   const [selectedPrayer, setSelectedPrayer] = useState(null);
   const [showPrayerModal, setShowPrayerModal] = useState(false);
 
@@ -21,7 +23,7 @@ const PrayerManagement = () => {
       setLoading(true);
       const response = await apiClient.get('/admin/prayers', {
         params: {
-          page: currentPage,
+          after: cursors[currentPage - 1] || undefined,
           limit: 10
         },
         headers: {
@@ -30,6 +32,11 @@ const PrayerManagement = () => {
       });
       setPrayers(response.data.prayers);
       setTotalPages(response.data.total_pages);
+      setCursors(prev => {
+        const next = prev.slice(0, currentPage);
+        if (response.data.next_cursor) next.push(response.data.next_cursor);
+        return next;
+      });
     } catch (err) {
       setError('Failed to fetch prayers');
       console.error('Prayers fetch error:', err);
@@ -337,8 +344,8 @@ const PrayerManagement = () => {
             Page {currentPage} of {totalPages}
           </span>
           <button
-            onClick={() => setCurrentPage(prev => Math.min(prev + 1, totalPages))}
-            disabled={currentPage === totalPages}
+            onClick={() => setCurrentPage(prev => prev + 1)}
+            disabled={!cursors[currentPage]}
             className="px-3 py-2 border border-gray-300 rounded-md disabled:opacity-50 disabled:cursor-not-allowed hover:bg-gray-50"
           >
             Next
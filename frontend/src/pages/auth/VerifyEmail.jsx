@@ -21,7 +21,7 @@ export default function VerifyEmail() {
     setError("");
 
     try {
-      const response = await apiClient.post("/auth/verify-email", { otp });
+      const response = await apiClient.post("/auth/verify-email", { email, otp });
 
       // Login the user with the returned token
       login(response.data.token, response.data.user_id);
@@ -1,4 +1,4 @@
-import apiClient from "../api/apiClient";
+import apiClient, { API_BASE_URL } from "../api/apiClient";
 
 const API_BASE = "/api/prayers";
 
@@ -22,6 +22,12 @@ export async function postPrayerRequest(payload) {
   return res.data;
 }
 
+// Live responses for one prayer thread; EventSource can't send headers, so the token goes in the URL
+export function openPrayerStream(id) {
+  const token = localStorage.getItem("access_token");
+  return new EventSource(`${API_BASE_URL}${API_BASE}/stream/${id}?token=${encodeURIComponent(token)}`);
+}
+
 export async function respondToPrayer(id, payload) {
   const res = await apiClient.post(`${API_BASE}/respond/${id}`, payload);
   return res.data;